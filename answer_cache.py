@@ -0,0 +1,147 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+# Longest a question waits for an identical one to be answered before giving up
+SHARED_ANSWER_TIMEOUT = 120
+
+
+def normalize_question(question):
+    return ' '.join(WORD_RE.findall(question.lower()))
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.answer = None
+        self.error = None
+
+
+class AnswerCache:
+    """TTL + LRU cache of answers keyed on (deck hash, slide, normalized question).
+
+    Identical questions that arrive while the first is still being answered wait for
+    that answer instead of calling Gemini again. With `similarity` set, a question whose
+    word set overlaps a cached question on the same slide by at least that Jaccard
+    ratio reuses its answer.
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600, similarity=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.hits = 0
+        self.near_hits = 0
+        self.shared = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (answer, expires_at)
+        self._inflight = {}            # key -> _Flight
+
+    @staticmethod
+    def key(deck_hash, slide_number, question):
+        return (deck_hash, int(slide_number), normalize_question(question))
+
+    def _lookup(self, key):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], 'hit'
+            del self._entries[key]
+        if self.similarity:
+            words = set(key[2].split())
+            for other, (answer, expires_at) in reversed(self._entries.items()):
+                if other[:2] == key[:2] and expires_at > now \
+                        and _jaccard(words, set(other[2].split())) >= self.similarity:
+                    self._entries.move_to_end(other)
+                    self.near_hits += 1
+                    return answer, 'near'
+        return None, None
+
+    def claim(self, key):
+        """Returns (source, value).
+
+        'hit' and 'near' come with the cached answer. 'shared' comes with the flight of
+        an identical question already being answered, to pass to wait(). 'leader' comes
+        with a new flight; the caller must answer and then call resolve() or reject().
+        """
+        with self._lock:
+            answer, source = self._lookup(key)
+            if source:
+                return source, answer
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.shared += 1
+                return 'shared', flight
+            self.misses += 1
+            flight = _Flight()
+            self._inflight[key] = flight
+            return 'leader', flight
+
+    def resolve(self, key, answer):
+        with self._lock:
+            self._entries[key] = (answer, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            flight = self._inflight.pop(key, None)
+        if flight is not None:
+            flight.answer = answer
+            flight.done.set()
+
+    def reject(self, key, error, flight=None):
+        """Fail the question's flight; with `flight`, only if that is still the one in progress."""
+        with self._lock:
+            if flight is not None and self._inflight.get(key) is not flight:
+                return
+            flight = self._inflight.pop(key, None)
+        if flight is not None:
+            flight.error = error
+            flight.done.set()
+
+    @staticmethod
+    def wait(flight, timeout=SHARED_ANSWER_TIMEOUT):
+        if not flight.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for an identical question to be answered")
+        if flight.error is not None:
+            raise flight.error
+        return flight.answer
+
+    def get_or_compute(self, key, compute):
+        """Returns (answer, source) where source is 'hit', 'near', 'shared' or 'miss'."""
+        source, value = self.claim(key)
+        if source in ('hit', 'near'):
+            return value, source
+        if source == 'shared':
+            return self.wait(value), 'shared'
+        try:
+            answer = compute()
+        except Exception as e:
+            self.reject(key, e)
+            raise
+        self.resolve(key, answer)
+        return answer, 'miss'
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.shared + self.misses
+            return {
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'shared': self.shared,
+                'misses': self.misses,
+                'hit_rate': (lookups - self.misses) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'in_flight': len(self._inflight),
+            }
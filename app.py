@@ -1,14 +1,36 @@
-from google import genai
-from google.genai import types
+from google.genai import errors, types
 import pathlib
+import argparse
 import os
 from dotenv import load_dotenv
 import asyncio
-import json
+import atexit
+import contextvars
+import httpx
+import importlib.util
+import itertools
 import re
+import time
 import logging
 import logging.handlers
+import queue
 from datetime import datetime
+from chunk_coverage import apply_assignments, clip_chunk, coverage_gaps
+from context_cache import context_cache
+from file_registry import file_registry
+from gemini_client import make_client
+from metrics import CALL_LOGGER_NAME, call_labels, call_metrics, labelled
+from json_repair import JSON_FIX_PROMPT, ChunkStreamParser, extract_json, record, repair_stats, validate_chunk_schema
+from pdf_pages import (
+    changed_pages, extract_page_texts, fingerprints_path_for, load_fingerprints, load_page_image_manifest,
+    page_count, page_fingerprints, render_page_images, save_fingerprints, write_page_range, write_pages
+)
+from retrieval import RetrievalIndex, index_path_for
+from packing import PackingStats, estimate_tokens, pack_slides, split_packed_response
+from result_cache import ResultCache, hash_text
+from slide_store import SlideStore, deck_id_for, slide_texts_path_for
+from scheduler import AdaptiveLimiter, SlideScheduler, call_with_retries, concurrency_for_model
+from shards import build_chunk, is_final, localize_chunks, merge_shard_chunks, shard_ranges, shared_pages
 
 def setup_logging():
     logger = logging.getLogger('pdfsummarizer')
@@ -23,11 +45,18 @@ def setup_logging():
     )
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    return logger
+    # Per-call JSON records are for the log file; the console keeps to progress messages
+    console_handler.addFilter(lambda record: record.name != CALL_LOGGER_NAME)
+    # Records are handed to a background thread that does the writing, so logging from the
+    # event loop never waits on disk or a slow terminal
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    return logger, listener
 
-logger = setup_logging()
+logger, log_listener = setup_logging()
 
 def truncate_log(message, max_length=100):
     if len(message) > max_length:
@@ -40,88 +69,80 @@ if not api_key:
     logger.error("API key not found. Make sure .env file is set correctly.")
     raise ValueError("API key not found. Make sure .env file is set correctly.")
 
-# Configure the client using the previous working method
-client = genai.Client(api_key=api_key)
+# Async calls of a run share one pooled HTTP connection set, sized for the scheduler's
+# peak concurrency. GEMINI_ASYNC_CLIENT=0 falls back to the blocking client run in
+# worker threads.
+USE_ASYNC_CLIENT = os.getenv("GEMINI_ASYNC_CLIENT", "1") != "0"
+HTTP_POOL_SIZE = int(os.getenv("GEMINI_HTTP_POOL_SIZE", "64"))
 
-def get_cache_path(pdf_path):
-    try:
-        pdf_path = pathlib.Path(pdf_path)
-        cache_dir = pdf_path.parent / '.cache'
-        cache_dir.mkdir(exist_ok=True)
-        logger.debug(f"Created cache directory: {cache_dir}")
-        return cache_dir / f"{pdf_path.stem}_summary.txt"
-    except Exception as e:
-        logger.error(f"Failed to create cache path: {truncate_log(str(e))}")
-        raise
+# Uploads, context caches and the blocking fallback; these don't depend on an event loop
+client = make_client(api_key)
 
-def read_cache(cache_path):
-    try:
-        # Convert string to Path if needed
-        if isinstance(cache_path, str):
-            cache_path = pathlib.Path(cache_path)
-            
-        if cache_path.exists():
-            logger.info(f"Reading cache from: {truncate_log(str(cache_path))}")
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return f.read()
-    except Exception as e:
-        logger.error(f"Cache read error: {truncate_log(str(e))}")
-    return None
+# The async client of the run in progress. Pooled connections belong to the event loop
+# that opened them, and the web app runs each job in its own asyncio.run(), so every run
+# gets a client of its own.
+run_client = contextvars.ContextVar('run_client', default=None)
 
-def write_cache(cache_path, content):
-    try:
-        # Convert string to Path if needed
-        if isinstance(cache_path, str):
-            cache_path = pathlib.Path(cache_path)
-            
-        # Create parent directories if they don't exist
-        cache_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        logger.info(f"Cache written to: {truncate_log(str(cache_path))}")
-    except Exception as e:
-        logger.error(f"Cache write error: {truncate_log(str(e))}")
-        raise
+def make_async_client():
+    http_options = None
+    # With aiohttp installed the SDK sends async requests through it and passes
+    # async_client_args to every request, which has no `limits` argument
+    if importlib.util.find_spec("aiohttp") is None:
+        http_options = types.HttpOptions(async_client_args={
+            "limits": httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+        })
+    return make_client(api_key, http_options=http_options)
 
-def get_initial_summary(file_path):
-    try:
-        cache_path = get_cache_path(file_path)
-        cached_summary = read_cache(cache_path)
-        if cached_summary:
-            logger.info("Using cached overall summary")
-            return cached_summary
-        logger.info(f"Uploading file for overall summarization: {truncate_log(str(file_path))}")
-        sample_file = client.files.upload(file=file_path)
-        logger.info("Requesting overall summary from Gemini...")
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[sample_file, "Please summarize each page of this document."]
-        )
-        summary_preview = truncate_log(response.text)
-        logger.info(f"Overall summary received. Preview: {summary_preview}")
-        write_cache(cache_path, response.text)
-        return response.text
-    except Exception as e:
-        logger.error(f"Failed to get overall summary: {truncate_log(str(e))}")
-        raise
+def open_run_client():
+    """Give this run its own async client, unless an enclosing run already has one.
 
-def get_chunk_summary(file_path):
-    try:
-        # Check cache first
-        base_cache_path = get_cache_path(file_path)
-        cache_path = str(base_cache_path).replace('_summary.txt', '_chunks.json')
-        cached_content = read_cache(cache_path)
-        if cached_content:
-            logger.info("Using cached chunk summary")
-            try:
-                return json.loads(cached_content)
-            except json.JSONDecodeError:
-                logger.warning("Cached chunk summary is invalid JSON, regenerating...")
+    Pass the result to close_run_client() when the run ends.
+    """
+    if not USE_ASYNC_CLIENT or run_client.get() is not None:
+        return None
+    async_client = make_async_client()
+    return async_client, run_client.set(async_client)
+
+async def close_run_client(opened):
+    if opened is None:
+        return
+    async_client, token = opened
+    run_client.reset(token)
+    # genai.Client has no public close in this SDK version; the fake backend has no pool
+    http = getattr(getattr(async_client, '_api_client', None), '_async_httpx_client', None)
+    if http is not None:
+        await http.aclose()
+
+MODEL_NAME = "gemini-2.0-flash"
+CACHE_DIR = pathlib.Path(os.getenv("PDFSUMMARIZER_CACHE_DIR", ".cache"))
+# The deck the web app serves, and what `python app.py` processes when given no PDFs
+DEFAULT_PDF_PATH = pathlib.Path(os.getenv("PDF_PATH", "03-storage1.pdf"))
+DEFAULT_DECK_ID = deck_id_for(DEFAULT_PDF_PATH)
+
+# Decks longer than CHUNK_SHARD_SIZE pages are chunked as page-range shards in parallel,
+# each shown CHUNK_SHARD_OVERLAP pages of its neighbours. 0 disables sharding.
+CHUNK_SHARD_SIZE = int(os.getenv("CHUNK_SHARD_SIZE", "40"))
+CHUNK_SHARD_OVERLAP = int(os.getenv("CHUNK_SHARD_OVERLAP", "3"))
+SHARD_DIR = CACHE_DIR / "shards"
+
+# Packed mode explains several slides of a chunk in one request, sized to this many estimated tokens
+PACKED_SLIDES = os.getenv("PACKED_SLIDES", "0") == "1"
+SLIDE_BATCH_TOKENS = int(os.getenv("SLIDE_BATCH_TOKENS", "8000"))
 
-        logger.info(f"Uploading file for chunk summarization: {truncate_log(str(file_path))}")
-        sample_file = client.files.upload(file=file_path)
-        chunk_prompt = '''
+# Slide requests reference a Gemini context cache holding the deck and overall summary
+# instead of resending the summary each time. GEMINI_CONTEXT_CACHE=0 turns this off.
+USE_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "1") != "0"
+
+# Pre-render every page to images for the viewer while the deck is processed
+RENDER_PAGE_IMAGES = os.getenv("RENDER_PAGE_IMAGES", "0") == "1"
+
+slide_store = SlideStore()
+
+result_cache = ResultCache(CACHE_DIR)
+
+OVERALL_SUMMARY_PROMPT = "Please summarize each page of this document."
+
+CHUNK_PROMPT = '''
         Analyze this document as if you are a computer science professor teaching a database systems course. Group the slides into meaningful chunks based on their content, with special attention to the following:
 
         1. EVERY slide must be analyzed and included in the output, even if it's a logistics/administrative slide
@@ -146,41 +167,323 @@ def get_chunk_summary(file_path):
         Remember: You are a professor explaining these concepts to students. Every slide should be analyzed for its educational value.
         IMPORTANT: Return ONLY valid JSON with no additional text.
         '''
-        logger.info("Requesting chunk summary from Gemini...")
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[sample_file, chunk_prompt]
-        )
-        text = response.text.strip()
-        logger.debug(f"Raw JSON response for chunk summarization: {truncate_log(text)}")
+
+SHARD_CHUNK_PROMPT = CHUNK_PROMPT + '''
+        Note: this document is an excerpt of a longer lecture, so it may start or end partway through a topic.
+        Number the slides from 1 in the order they appear in this document.
+        '''
+
+COVERAGE_PROMPT = '''
+        The attached document contains slides {pages} of a lecture, in that order. They were left out of,
+        or listed more than once in, this grouping of the lecture into chunks:
+
+        {chunk_list}
+
+        For each attached slide, pick the chunk it belongs to by its number, or null if it starts a new topic.
+        Slides listed more than once must be assigned to exactly one of the chunks that listed them.
+
+        Required JSON structure (must be valid, no extra text):
+        {{
+            "assignments": [
+                {{
+                    "slide_number": 7,
+                    "chunk": 0,
+                    "topic": "Topic name if chunk is null",
+                    "content": "Detailed content of the slide"
+                }}
+            ]
+        }}
+
+        IMPORTANT: Return ONLY valid JSON with no additional text.
+        '''
+
+# The limiter of the run in progress. Requests outside the slide scheduler (summaries,
+# chunking, repairs) hold one of its slots too, so decks processed side by side share
+# a single concurrency budget.
+request_limiter = contextvars.ContextVar('request_limiter', default=None)
+
+def request_with_retries(factory, label):
+    """Run a request outside the slide scheduler in a slot of the run's limiter, retried like slide jobs."""
+    return call_with_retries(factory, request_limiter.get(), label)
+
+def uses_context_cache(config):
+    return bool(getattr(config, 'cached_content', None))
+
+async def generate_content(contents, model=MODEL_NAME, config=None, operation="generate"):
+    with call_metrics.timed(operation, model, uses_context_cache(config)) as call:
+        if USE_ASYNC_CLIENT:
+            return call.done(await (run_client.get() or client).aio.models.generate_content(
+                model=model, contents=contents, config=config
+            ))
+        return call.done(await asyncio.to_thread(
+            client.models.generate_content, model=model, contents=contents, config=config
+        ))
+
+async def generate_content_stream(contents, model=MODEL_NAME, config=None, operation="generate"):
+    with call_metrics.timed(operation, model, uses_context_cache(config)) as call:
+        if USE_ASYNC_CLIENT:
+            async for chunk in await (run_client.get() or client).aio.models.generate_content_stream(
+                model=model, contents=contents, config=config
+            ):
+                yield call.done(chunk)
+            return
+        # The blocking client can't stream into the event loop; deliver the whole response at once
+        yield call.done(await asyncio.to_thread(
+            client.models.generate_content, model=model, contents=contents, config=config
+        ))
+
+async def get_uploaded_file(file_path):
+    # The registry shares one upload across threads, so the blocking upload runs off the event loop
+    return await asyncio.to_thread(file_registry.get, client, file_path)
+
+async def get_deck_context(file_path, overall_summary):
+    """Context cache handle for the deck and its overall summary, or None to send full prompts."""
+    if not USE_CONTEXT_CACHE or not file_path or not overall_summary:
+        return None
+    pdf_hash = file_registry.content_hash(file_path)
+    return await asyncio.to_thread(
+        context_cache.get, client, pdf_hash, MODEL_NAME, overall_summary,
+        lambda: file_registry.get(client, file_path)
+    )
+
+async def generate_with_context(prompt, suffix, context=None, operation="generate", **config):
+    """Send only `suffix` against the context cache when there is one, else the full prompt."""
+    if context is not None:
         try:
-            parsed_json = json.loads(text)
-            logger.info("Successfully parsed structured JSON for chunk summarization")
-            # Cache the successful response
-            write_cache(cache_path, json.dumps(parsed_json, indent=2))
-            return parsed_json
-        except json.JSONDecodeError as e:
-            logger.warning(f"Direct JSON parsing for chunk summary failed: {truncate_log(str(e))}")
-            logger.info("Attempting regex extraction for chunk summary...")
-            potential_json = re.sub(r'^[^{]*|[^}]*$', '', text)
-            try:
-                if potential_json:
-                    parsed_json = json.loads(potential_json)
-                    logger.info("Successfully parsed JSON after cleanup")
-                    if "academic_context" in parsed_json and "chunks" in parsed_json:
-                        # Cache the cleaned and valid JSON
-                        write_cache(cache_path, json.dumps(parsed_json, indent=2))
-                        return parsed_json
-                logger.warning("Cleaned JSON still invalid or missing required fields")
-            except json.JSONDecodeError:
-                logger.error("Failed to parse cleaned JSON")
-            
-            logger.warning("Returning empty structure for chunk summary due to parsing failures")
+            response = await generate_content(
+                suffix, model=context.model, config=context_cache.config(context, **config), operation=operation
+            )
+            # The uncached prompt carries the summary but not the PDF
+            context_cache.record_usage(context, response, estimate_tokens(prompt) - estimate_tokens(suffix))
+            return response
+        except errors.ClientError as e:
+            # The cache expired or was deleted under us; fall back to the full prompt
+            if e.code not in (400, 403, 404):
+                raise
+            logger.warning(f"Context cache {context.name} rejected, sending full prompt: {truncate_log(str(e))}")
+            context_cache.invalidate(context)
+    return await generate_content(
+        prompt, config=types.GenerateContentConfig(**config) if config else None, operation=operation
+    )
+
+async def get_initial_summary(file_path):
+    try:
+        pdf_hash = file_registry.content_hash(file_path)
+        cached_summary = result_cache.get("overall_summary", pdf_hash, MODEL_NAME, OVERALL_SUMMARY_PROMPT)
+        if cached_summary:
+            logger.info("Using cached overall summary")
+            return cached_summary
+        sample_file = await get_uploaded_file(file_path)
+        logger.info("Requesting overall summary from Gemini...")
+        response = await request_with_retries(
+            lambda: generate_content([sample_file, OVERALL_SUMMARY_PROMPT], operation="overall_summary"),
+            "overall summary"
+        )
+        summary_preview = truncate_log(response.text)
+        logger.info(f"Overall summary received. Preview: {summary_preview}")
+        result_cache.put("overall_summary", pdf_hash, MODEL_NAME, OVERALL_SUMMARY_PROMPT, response.text)
+        return response.text
+    except Exception as e:
+        logger.error(f"Failed to get overall summary: {truncate_log(str(e))}")
+        raise
+
+async def parse_chunk_response(text, label="chunk summary"):
+    """Validated chunk structure from a response, or None if neither local nor model repair recovers it."""
+    logger.debug(f"Raw JSON response for {label}: {truncate_log(text)}")
+    try:
+        parsed_json = validate_chunk_schema(extract_json(text))
+        logger.info(f"Successfully parsed structured JSON for {label}")
+        return parsed_json
+    except ValueError as e:
+        # Local repair failed; as a last resort ask the model to fix its own output
+        logger.warning(f"Local JSON repair for {label} failed: {truncate_log(str(e))}")
+    record('model_calls')
+    fixed = await request_with_retries(
+        lambda: generate_content(JSON_FIX_PROMPT.format(text=text), operation="json_fix"), f"repair of {label}"
+    )
+    try:
+        parsed_json = validate_chunk_schema(extract_json(fixed.text))
+        logger.info(f"Successfully parsed {label} after model repair")
+        return parsed_json
+    except ValueError as e:
+        logger.warning(f"Giving up on {label} due to parsing failures: {truncate_log(str(e))}")
+        return None
+
+async def get_chunk_summary(file_path, on_chunk=None):
+    """Group the deck's slides into chunks.
+
+    The response is streamed and on_chunk(chunk) is called for each chunk as soon as
+    its JSON object is complete, so slide generation can start before the full answer
+    arrives. Chunks only recovered from the complete response are reported at the end.
+    Decks longer than CHUNK_SHARD_SIZE pages are chunked in shards instead. Pages the
+    chunks skip are reported last, in follow-up chunks from reconcile_coverage().
+    """
+    try:
+        pdf_hash = file_registry.content_hash(file_path)
+        pages = await asyncio.to_thread(page_count, file_path)
+        reported = set()
+
+        def report(chunks):
+            for chunk in chunks:
+                # Never schedule pages the deck doesn't have
+                chunk = clip_chunk(chunk, pages)
+                key = tuple(chunk['slide_numbers'])
+                if key and key not in reported:
+                    reported.add(key)
+                    if on_chunk:
+                        on_chunk(chunk)
+
+        if CHUNK_SHARD_SIZE and pages > CHUNK_SHARD_SIZE:
+            parsed_json = await get_sharded_chunk_summary(file_path, pdf_hash, pages, report)
+            return await reconcile_coverage(file_path, pdf_hash, parsed_json, pages, report)
+
+        # Check cache first
+        cached_chunks = result_cache.get("chunks", pdf_hash, MODEL_NAME, CHUNK_PROMPT)
+        if cached_chunks:
+            logger.info("Using cached chunk summary")
+            report(cached_chunks.get('chunks', []))
+            return cached_chunks
+
+        sample_file = await get_uploaded_file(file_path)
+        logger.info("Requesting chunk summary from Gemini...")
+
+        async def stream_chunks():
+            # A retry starts the response over; chunks already reported aren't reported again
+            parser = ChunkStreamParser()
+            async for piece in generate_content_stream([sample_file, CHUNK_PROMPT], operation="chunks"):
+                if piece.text:
+                    report(parser.feed(piece.text))
+            return parser.buffer.strip()
+
+        parsed_json = await parse_chunk_response(await request_with_retries(stream_chunks, "chunk summary"))
+        if parsed_json is None:
+            logger.warning("Returning empty structure for chunk summary")
             return {"academic_context": "", "chunks": []}
+        report(parsed_json['chunks'])
+        parsed_json = await reconcile_coverage(file_path, pdf_hash, parsed_json, pages, report)
+        # Cache the successful response
+        result_cache.put("chunks", pdf_hash, MODEL_NAME, CHUNK_PROMPT, parsed_json)
+        return parsed_json
     except Exception as e:
         logger.error(f"Failed to get chunk summary: {truncate_log(str(e))}")
         raise
 
+async def get_shard_chunks(file_path, pdf_hash, shard):
+    """Chunk one page range of the deck; slide numbers in the result count from 1 within the shard."""
+    label = f"chunk summary of pages {shard.start}-{shard.end}"
+    # The page range is part of the key so each shard of a deck caches separately
+    cache_prompt = f"{SHARD_CHUNK_PROMPT}\npages {shard.start}-{shard.end}"
+    cached_chunks = result_cache.get("chunks", pdf_hash, MODEL_NAME, cache_prompt)
+    if cached_chunks:
+        logger.info(f"Using cached {label}")
+        return cached_chunks
+    shard_path = SHARD_DIR / f"{pdf_hash[:16]}-{shard.start}-{shard.end}.pdf"
+    if not shard_path.exists():
+        await asyncio.to_thread(write_page_range, file_path, shard.start, shard.end, shard_path)
+    sample_file = await get_uploaded_file(shard_path)
+    logger.info(f"Requesting {label} from Gemini...")
+    response = await request_with_retries(
+        lambda: generate_content([sample_file, SHARD_CHUNK_PROMPT], operation="shard_chunks"), label
+    )
+    parsed_json = await parse_chunk_response(response.text.strip(), label)
+    if parsed_json is None:
+        return None
+    result_cache.put("chunks", pdf_hash, MODEL_NAME, cache_prompt, parsed_json)
+    return parsed_json
+
+async def get_sharded_chunk_summary(file_path, pdf_hash, pages, report):
+    """Chunk overlapping page ranges of a long deck in parallel and merge the results.
+
+    A chunk that touches no overlap page can't be merged with anything, so it is
+    reported as soon as its shard finishes; the rest are reported after the merge.
+    """
+    shards = shard_ranges(pages, CHUNK_SHARD_SIZE, CHUNK_SHARD_OVERLAP)
+    overlap_pages = shared_pages(shards)
+    logger.info(f"Chunking {pages} pages in {len(shards)} shards of up to {CHUNK_SHARD_SIZE} pages")
+    semaphore = asyncio.Semaphore(concurrency_for_model(MODEL_NAME)["initial"])
+
+    async def run(shard):
+        async with semaphore:
+            try:
+                parsed_json = await get_shard_chunks(file_path, pdf_hash, shard)
+            except Exception as e:
+                logger.error(f"Failed to chunk pages {shard.start}-{shard.end}: {truncate_log(str(e))}")
+                parsed_json = None
+        if parsed_json is None:
+            return "", []
+        localized = localize_chunks(shard, parsed_json['chunks'])
+        report([build_chunk([m]) for m in localized if is_final(m, overlap_pages)])
+        return parsed_json.get('academic_context', ''), localized
+
+    results = await asyncio.gather(*(run(shard) for shard in shards))
+    chunks = merge_shard_chunks([localized for _, localized in results])
+    report(chunks)
+    contexts = []
+    for context, _ in results:
+        if context and context not in contexts:
+            contexts.append(context)
+    logger.info(f"Merged {sum(len(localized) for _, localized in results)} shard chunks into {len(chunks)}")
+    return {"academic_context": " ".join(contexts), "chunks": chunks}
+
+async def reconcile_coverage(file_path, pdf_hash, parsed_json, pages, report):
+    """Make every page of the deck appear in exactly one chunk.
+
+    Pages no chunk lists and pages listed by several chunks are sent, on their own, in one
+    small follow-up call that assigns each to a chunk. Newly covered pages are reported as
+    follow-up chunks so only they get summarized. A duplicated page keeps the summary it
+    already got; only its chunk membership changes.
+    """
+    missing, duplicates = coverage_gaps(parsed_json['chunks'], pages)
+    if not parsed_json['chunks'] or (not missing and not duplicates):
+        return parsed_json
+    logger.warning(f"Chunk summary skipped {len(missing)} of {pages} pages and listed "
+                   f"{len(duplicates)} more than once")
+    targets = sorted(set(missing) | set(duplicates))
+    chunk_list = "\n        ".join(
+        f"{idx}: {chunk['topic']} (slides {', '.join(map(str, chunk['slide_numbers']))})"
+        for idx, chunk in enumerate(parsed_json['chunks'])
+    )
+    prompt = COVERAGE_PROMPT.format(pages=', '.join(map(str, targets)), chunk_list=chunk_list)
+    assignments = result_cache.get("coverage", pdf_hash, MODEL_NAME, prompt)
+    if assignments is None:
+        try:
+            pages_path = SHARD_DIR / f"{pdf_hash[:16]}-pages-{hash_text(prompt)[:12]}.pdf"
+            await asyncio.to_thread(write_pages, file_path, targets, pages_path)
+            sample_file = await get_uploaded_file(pages_path)
+            logger.info(f"Requesting chunk assignments for {len(targets)} pages from Gemini...")
+            response = await request_with_retries(
+                lambda: generate_content([sample_file, prompt], operation="coverage"), "coverage follow-up"
+            )
+            data = extract_json(response.text)
+            assignments = data.get('assignments') if isinstance(data, dict) else data
+            if not isinstance(assignments, list):
+                raise ValueError("Coverage response has no 'assignments' list")
+            result_cache.put("coverage", pdf_hash, MODEL_NAME, prompt, assignments)
+        except Exception as e:
+            # Still cover the pages, next to their neighbours
+            logger.warning(f"Coverage follow-up failed, placing pages by position: {truncate_log(str(e))}")
+            assignments = []
+    chunks, follow_ups = apply_assignments(parsed_json['chunks'], pages, assignments)
+    report(follow_ups)
+    logger.info(f"Coverage reconciled: {len(missing)} missing pages assigned, "
+                f"{len(duplicates)} duplicated pages resolved")
+    return {**parsed_json, 'chunks': chunks}
+
+def start_chunk_feed(file_path):
+    """Start the chunk summary; returns (async iterator of chunks as they parse, task for the full result)."""
+    queue = asyncio.Queue()
+    task = asyncio.ensure_future(get_chunk_summary(file_path, on_chunk=queue.put_nowait))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+
+    async def feed():
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    return feed(), task
+
 def get_slide_prompt(slide_number, overall_summary, structured_data):
     chunk_context = None 
     for chunk in structured_data.get('chunks', []):
@@ -188,6 +491,9 @@ def get_slide_prompt(slide_number, overall_summary, structured_data):
             chunk_context = chunk
             break
 
+    # The overall summary may not be ready yet when slide generation starts early
+    context_section = f"Context:\n{overall_summary}\n\n" if overall_summary else ""
+
     prompt = f"""Analyze slide {slide_number} and explain its technical content clearly and thoroughly.
 
 Output Format:
@@ -207,151 +513,552 @@ Use markdown for:
 - Important terms (**bold**)
 - Brief code examples in `backticks` only
 
-Context:
-{overall_summary}
-
-Chunk Context:
+{context_section}Chunk Context:
 {chunk_context}
 """
     return prompt
 
-async def process_slide(slide_number, overall_summary, structured_data, slide_texts):
+async def process_slide(slide_number, overall_summary, structured_data, slide_texts, pdf_hash=None, stats=None,
+                        file_path=None):
     try:
         prompt = get_slide_prompt(slide_number, overall_summary, structured_data)
+        if pdf_hash:
+            # A result generated before the overall summary was available is still valid
+            candidates = [prompt]
+            if overall_summary:
+                candidates.append(get_slide_prompt(slide_number, None, structured_data))
+            for candidate in candidates:
+                cached_result = result_cache.get("slide", pdf_hash, MODEL_NAME, candidate)
+                if cached_result:
+                    logger.info(f"Using cached explanation for slide {slide_number}")
+                    return cached_result
         logger.info(f"Requesting unique explanation for Slide {slide_number}...")
-        response = await asyncio.to_thread(
-            lambda: client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt
+        context = await get_deck_context(file_path, overall_summary)
+        with labelled(slide=slide_number):
+            response = await generate_with_context(
+                prompt, get_slide_prompt(slide_number, None, structured_data), context, operation="slide"
             )
-        )
+        if stats is not None:
+            tokens = estimate_tokens(prompt)
+            stats.record(tokens, 1, tokens)
         logger.info(f"Successfully generated summary for slide {slide_number}")
         
         text = response.text.strip()
         title_match = re.search(r'^#\s*(.*?)(?=\n|$)', text)
         title = title_match.group(1) if title_match else f"Slide {slide_number}"
         
-        return {
+        result = {
             'slide_number': slide_number,
             'title': title,
             'explanation': text
         }
+        if pdf_hash:
+            result_cache.put("slide", pdf_hash, MODEL_NAME, prompt, result)
+        return result
     except Exception as e:
         logger.error(f"Failed to process slide {slide_number}: {truncate_log(str(e))}")
         raise
 
-async def process_all_academic_slides(overall_summary, structured_data):
+def get_packed_slide_prompt(slide_numbers, overall_summary, chunk_context):
+    context_section = f"Context:\n{overall_summary}\n\n" if overall_summary else ""
+    slide_list = ', '.join(map(str, slide_numbers))
+
+    prompt = f"""Analyze slides {slide_list} and explain the technical content of each one clearly and thoroughly.
+
+Write a separate explanation for every listed slide. Key points to cover for each:
+1. Core technical concepts and their significance
+2. Practical implications and real-world applications 
+3. Connection to other database concepts
+4. Examples that illustrate the concepts
+
+Use markdown in explanations for:
+- Headers (#)
+- Lists (* or -)
+- Important terms (**bold**)
+- Brief code examples in `backticks` only
+
+Required JSON structure (must be valid, no extra text):
+{{
+    "slides": [
+        {{"slide_number": {slide_numbers[0]}, "title": "Brief Title", "explanation": "Direct explanation in markdown"}}
+    ]
+}}
+
+{context_section}Chunk Context:
+{chunk_context}
+"""
+    return prompt
+
+async def process_slide_batch(slide_numbers, overall_summary, chunk, structured_data, slide_texts,
+                              pdf_hash=None, stats=None, file_path=None):
+    """Explain several slides of one chunk in a single request; returns a list of process_slide results.
+
+    Slides the packed response leaves out are explained one at a time.
+    """
+    try:
+        prompt = get_packed_slide_prompt(slide_numbers, overall_summary, chunk)
+        results = None
+        if pdf_hash:
+            candidates = [prompt]
+            if overall_summary:
+                candidates.append(get_packed_slide_prompt(slide_numbers, None, chunk))
+            for candidate in candidates:
+                results = result_cache.get("slide_batch", pdf_hash, MODEL_NAME, candidate)
+                if results is not None:
+                    logger.info(f"Using cached explanations for slides {slide_numbers}")
+                    break
+        if results is None:
+            logger.info(f"Requesting packed explanations for slides {slide_numbers}...")
+            context = await get_deck_context(file_path, overall_summary)
+            with labelled(slides=list(slide_numbers)):
+                response = await generate_with_context(
+                    prompt, get_packed_slide_prompt(slide_numbers, None, chunk), context, operation="slide_batch",
+                    response_mime_type="application/json"
+                )
+            try:
+                data = extract_json(response.text)
+            except ValueError as e:
+                logger.warning(f"Could not parse packed response for slides {slide_numbers}: "
+                               f"{truncate_log(str(e))}")
+                data = None
+            parsed = split_packed_response(data, slide_numbers)
+            results = [{'slide_number': sn, **parsed[sn]} for sn in slide_numbers if sn in parsed]
+            if stats is not None:
+                # Slides the response left out are counted when they are requested on their own
+                stats.record(estimate_tokens(prompt), len(parsed), sum(
+                    estimate_tokens(get_slide_prompt(sn, overall_summary, structured_data)) for sn in parsed
+                ))
+            if data is not None and pdf_hash:
+                result_cache.put("slide_batch", pdf_hash, MODEL_NAME, prompt, results)
+
+        missing = [sn for sn in slide_numbers if sn not in {r['slide_number'] for r in results}]
+        if missing:
+            logger.warning(f"Packed response left out slides {missing}; explaining them one at a time")
+            results = results + list(await asyncio.gather(*(
+                process_slide(sn, overall_summary, structured_data, slide_texts, pdf_hash, stats, file_path)
+                for sn in missing
+            )))
+        return results
+    except Exception as e:
+        logger.error(f"Failed to process slides {slide_numbers}: {truncate_log(str(e))}")
+        raise
+
+def chunk_neighbours(slide_numbers, structured_data):
+    """The given slides plus the slides on either side of them within their chunk."""
+    neighbours = set(slide_numbers)
+    for chunk in structured_data.get('chunks', []):
+        chunk_slides = chunk.get('slide_numbers', [])
+        for idx, sn in enumerate(chunk_slides):
+            if sn in slide_numbers:
+                neighbours.update(chunk_slides[max(0, idx - 1):idx + 2])
+    return neighbours
+
+def notify(on_event, event, data):
+    if on_event is None:
+        return
     try:
-        slide_texts_path = pathlib.Path("static/data/slide_texts.json")
-        
-        # Get all slide numbers from all chunks
+        on_event(event, data)
+    except Exception as e:
+        logger.error(f"Progress listener failed on {event}: {truncate_log(str(e))}")
+
+async def iterate_chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+def resolved_summary(overall_summary):
+    """The overall summary if it is available yet, else None. Accepts a string or a task."""
+    if overall_summary is None or isinstance(overall_summary, str):
+        return overall_summary
+    if overall_summary.done() and not overall_summary.cancelled() and overall_summary.exception() is None:
+        return overall_summary.result()
+    return None
+
+async def process_all_academic_slides(overall_summary, structured_data, pdf_hash=None, slides=None,
+                                      deck_id=DEFAULT_DECK_ID, on_event=None, chunk_feed=None, packed=False,
+                                      file_path=None, limiter=None, attach_promoter=None):
+    """Generate explanations for every chunked slide.
+
+    With `slides` (the new or changed pages), only those slides and their neighbours within
+    their chunk are regenerated; other slides keep their existing summaries and entries for
+    pages no longer in the deck are dropped. With `chunk_feed`, an async iterator of chunks,
+    each chunk is appended to structured_data as it arrives and its slides are scheduled
+    right away. `overall_summary` may be a task still running; slides started before it
+    finishes are generated without it. With `packed`, slides of a chunk are explained in
+    batches sized to SLIDE_BATCH_TOKENS instead of one request each. With `file_path`, slides
+    that start after the overall summary arrives use the deck's context cache. `limiter`
+    shares one concurrency budget with other decks processed at the same time.
+    on_event(event, data) is called as slides are scheduled, finish and fail.
+    attach_promoter(loop, promote_slide) is called once slides can be scheduled; calling
+    promote_slide(n) on the loop moves slide n and its neighbours ahead of the other
+    slides still waiting, or has them scheduled first when their chunk arrives.
+    """
+    feeder = None
+    try:
+        if chunk_feed is None:
+            chunk_feed = iterate_chunks(list(structured_data.get('chunks', [])))
+        else:
+            structured_data.setdefault('chunks', [])
+
+        # Load what earlier runs left behind so unchanged slides can be reused
+        existing = slide_store.load(deck_id)
+        slide_texts = {}
         all_slides = set()
-        for chunk in structured_data.get('chunks', []):
-            for sn in chunk.get('slide_numbers', []):
-                all_slides.add(sn)
-        
-        logger.info(f"Found {len(all_slides)} slides to process")
-        
-        # Try to load existing slide_texts first
-        try:
-            with open(slide_texts_path, 'r') as f:
-                slide_texts = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            slide_texts = {}
-        
-        # Initialize any missing slides
-        for slide_num in all_slides:
-            if str(slide_num) not in slide_texts:
-                slide_texts[str(slide_num)] = {
-                    "title": "",
-                    "summary": ""
-                }
-            
-        # Save initial state
-        with open(slide_texts_path, 'w') as f:
-            json.dump(slide_texts, f, indent=4)
-        
-        # Process slides in smaller batches to avoid overwhelming Gemini
-        batch_size = 5
-        all_slides_list = sorted(list(all_slides))
-        successful_slides = 0
-        
-        for i in range(0, len(all_slides_list), batch_size):
-            batch = all_slides_list[i:i + batch_size]
-            logger.info(f"Processing batch of slides {batch}")
-            
-            # Process batch in parallel
-            tasks = []
-            for sn in batch:
-                # Find the chunk this slide belongs to
-                chunk_context = None
-                for chunk in structured_data.get('chunks', []):
-                    if sn in chunk.get('slide_numbers', []):
-                        chunk_context = chunk
-                        break
-                
-                task = process_slide(sn, overall_summary, structured_data, slide_texts)
-                tasks.append(task)
-            
-            # Wait for all slides in this batch to complete
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Update slide_texts with results
-            for res in batch_results:
-                if isinstance(res, Exception):
-                    logger.error(f"Failed to process slide: {truncate_log(str(res))}")
+        to_process = []
+
+        # Keep a sliding window of requests in flight; its size adapts to how Gemini responds
+        scheduler = SlideScheduler(limiter or AdaptiveLimiter(**concurrency_for_model(MODEL_NAME)))
+        packing_stats = PackingStats()
+        slide_keys = {}   # slide number -> key of the scheduler job that generates it
+        wanted = {}       # slide number -> priority asked for before its chunk arrived
+        promotions = itertools.count(1)
+
+        def promote_slide(sn):
+            # Later requests go ahead of earlier ones; the slide asked for ahead of its neighbours
+            urgency = -2 * next(promotions)
+            for neighbour, priority in ((sn, urgency), (sn - 1, urgency + 1), (sn + 1, urgency + 1)):
+                if neighbour in slide_keys:
+                    if scheduler.promote(slide_keys[neighbour], priority):
+                        logger.info(f"Slide {neighbour} moved up the queue (requested slide {sn})")
+                elif neighbour > 0 and neighbour not in all_slides:
+                    wanted[neighbour] = min(priority, wanted.get(neighbour, 0))
+
+        def schedule_chunk(chunk):
+            new_slides = [sn for sn in chunk.get('slide_numbers', []) if sn not in all_slides]
+            all_slides.update(new_slides)
+            # Initialize any missing slides
+            slide_store.ensure_slides(deck_id, new_slides)
+            for sn in new_slides:
+                slide_texts[str(sn)] = dict(existing.get(str(sn)) or {"title": "", "summary": ""})
+            if slides is None:
+                chosen = new_slides
+            else:
+                regenerate = chunk_neighbours(set(slides), {'chunks': [chunk]})
+                # Slides without a summary yet can't be reused
+                chosen = [sn for sn in new_slides if sn in regenerate or not slide_texts[str(sn)]["summary"]]
+            batches = [[sn] for sn in chosen]
+            if packed and chosen:
+                prefix = get_packed_slide_prompt(chosen[:1], resolved_summary(overall_summary), chunk)
+                batches = pack_slides(chosen, estimate_tokens(prefix), SLIDE_BATCH_TOKENS)
+            for batch in batches:
+                priority = min(wanted.pop(sn, 0) for sn in batch)
+                if len(batch) > 1:
+                    key = tuple(batch)
+                    slide_keys.update((sn, key) for sn in batch)
+                    scheduler.submit(key, lambda batch=batch: process_slide_batch(
+                        batch, resolved_summary(overall_summary), chunk, structured_data, slide_texts,
+                        pdf_hash, packing_stats, file_path
+                    ), priority)
                     continue
-                    
-                sn = res.get('slide_number')
-                if sn:
-                    if 'title' in res:
-                        slide_texts[str(sn)]["title"] = res['title']
-                    if 'explanation' in res:
-                        slide_texts[str(sn)]["summary"] = res['explanation']
-                    successful_slides += 1
-                    logger.info(f"Slide {sn} successfully summarized")
-            
-            # Save after each batch
+                # A lone slide goes out as a regular request
+                sn = batch[0]
+                slide_keys[sn] = sn
+                scheduler.submit(sn, lambda sn=sn: process_slide(
+                    sn, resolved_summary(overall_summary), structured_data, slide_texts, pdf_hash,
+                    packing_stats if packed else None, file_path
+                ), priority)
+            to_process.extend(chosen)
+            notify(on_event, 'scheduled', {'slides': chosen, 'total': len(to_process)})
+
+        async def feed_chunks():
             try:
-                with open(slide_texts_path, 'w') as f:
-                    json.dump(slide_texts, f, indent=4)
-                logger.info(f"Saved progress after batch ending with slide {batch[-1]}")
-            except Exception as e:
-                logger.error(f"Failed to save progress: {truncate_log(str(e))}")
+                async for chunk in chunk_feed:
+                    if chunk not in structured_data['chunks']:
+                        structured_data['chunks'].append(chunk)
+                    schedule_chunk(chunk)
+            finally:
+                scheduler.close()
+
+        if attach_promoter is not None:
+            attach_promoter(asyncio.get_running_loop(), promote_slide)
+        notify(on_event, 'started', {})
+        started_at = time.monotonic()
+        feeder = asyncio.ensure_future(feed_chunks())
+        successful_slides = 0
+        failed_slides = 0
+        async for res in scheduler.results():
+            # Packed jobs cover several slides; report each one separately
+            if res.error is not None:
+                outcomes = [(sn, None) for sn in (res.key if isinstance(res.key, tuple) else [res.key])]
+            else:
+                outcomes = [(r.get('slide_number'), r) for r in (res.value if isinstance(res.value, list) else [res.value])]
+            for sn, value in outcomes:
+                elapsed = time.monotonic() - started_at
+                progress = {
+                    'completed': successful_slides + failed_slides + 1,
+                    'total': len(to_process),
+                    'slides_per_minute': 60 * (successful_slides + failed_slides + 1) / elapsed if elapsed else 0.0,
+                }
+                if value is None:
+                    failed_slides += 1
+                    logger.error(f"Failed to process slide {sn} after {res.attempts} attempt(s): "
+                                 f"{truncate_log(str(res.error))}")
+                    if slides is not None and sn in slides and slide_texts[str(sn)]["summary"]:
+                        # The kept summary describes the page before it changed
+                        slide_texts[str(sn)] = {"title": "", "summary": ""}
+                        slide_store.upsert_slide(deck_id, sn, "", "")
+                    notify(on_event, 'slide_failed', {
+                        'slide_number': sn, 'error': str(res.error), 'attempts': res.attempts, **progress
+                    })
+                    continue
+                slide_texts[str(sn)]["title"] = value.get('title', '')
+                slide_texts[str(sn)]["summary"] = value.get('explanation', '')
+                slide_store.upsert_slide(deck_id, sn, slide_texts[str(sn)]["title"], slide_texts[str(sn)]["summary"])
+                successful_slides += 1
+                logger.info(f"Slide {sn} successfully summarized ({res.latency:.1f}s, {res.attempts} attempt(s))")
+                notify(on_event, 'slide', {
+                    'slide_number': sn, **slide_texts[str(sn)],
+                    'latency': res.latency, 'attempts': res.attempts, **progress
+                })
+        await feeder
+
+        logger.info(f"Found {len(all_slides)} slides in {len(structured_data['chunks'])} chunks")
+        if slides is not None:
+            slide_store.delete_slides_except(deck_id, all_slides)
+            logger.info(f"Regenerated {len(to_process)} of {len(all_slides)} slides")
+        
+        # Keep the JSON the frontend and older tooling read in sync with the store
+        try:
+            slide_store.export_json(deck_id, slide_texts_path_for(deck_id))
+        except Exception as e:
+            logger.error(f"Failed to export slide texts: {truncate_log(str(e))}")
         
-        logger.info(f"Successfully processed {successful_slides} out of {len(all_slides)} slides")
-        return slide_texts, all_slides
+        logger.info(f"Successfully processed {successful_slides} out of {len(to_process)} slides")
+        if packed:
+            logger.info(f"Packed mode: {packing_stats.summary()}")
+        notify(on_event, 'completed', {
+            'successful': successful_slides, 'failed': failed_slides, 'total': len(to_process),
+            'duration': time.monotonic() - started_at
+        })
+        return slide_texts, all_slides, set(to_process)
     except Exception as e:
         logger.error(f"Failed to process slides: {truncate_log(str(e))}")
         raise
+    finally:
+        if feeder is not None and not feeder.done():
+            feeder.cancel()
+
+def build_retrieval_index(file_path, deck_id, pdf_hash, structured_data):
+    """Index page text, generated summaries and chunk topics so questions can retrieve slides locally."""
+    index = RetrievalIndex.build(
+        extract_page_texts(file_path), slide_store.load(deck_id), structured_data, pdf_hash
+    )
+    index.save(index_path_for(deck_id))
+    logger.info(f"Retrieval index written for {len(index.docs)} slides")
 
-async def main():
+async def main(file_path=DEFAULT_PDF_PATH, incremental=False, on_event=None, packed=PACKED_SLIDES,
+               limiter=None, render_pages=RENDER_PAGE_IMAGES, attach_promoter=None):
+    """Process one deck. Returns a summary of the run, or None if the deck yielded no chunks.
+
+    Pass the same `limiter` to decks processed at the same time to give them one shared
+    request budget. With `render_pages`, page images for the viewer are rendered in a
+    worker thread while the model calls run. `attach_promoter` is passed on to
+    process_all_academic_slides so a viewer can have the slides it shows generated first.
+    """
     start_time = datetime.now()
     logger.info("===== STARTING PDF SUMMARIZATION =====")
+    limiter = limiter or AdaptiveLimiter(**concurrency_for_model(MODEL_NAME))
+    # Set before any task is started so they all inherit it
+    limiter_token = request_limiter.set(limiter)
+    opened_client = open_run_client()
+    labels_token = call_labels.set({**call_labels.get(), 'deck': deck_id_for(file_path)})
+    completed = {}
+    failed = set()
+    overall_summary = None
+
+    def track(event, data):
+        if event == 'completed':
+            completed.update(data)
+        elif event == 'slide_failed':
+            failed.add(data['slide_number'])
+        if on_event is not None:
+            on_event(event, data)
     
     try:
-        file_path = pathlib.Path("/Users/anthony/Desktop/2025_cs_projects/pdfsummarizer/03-storage1.pdf")
+        file_path = pathlib.Path(file_path)
         logger.info(f"Processing file: {truncate_log(str(file_path))}")
+        deck_id = deck_id_for(file_path)
+        pdf_hash = file_registry.content_hash(file_path)
+        fingerprints = await asyncio.to_thread(page_fingerprints, file_path)
+        page_images = None
+        if render_pages and load_page_image_manifest(pdf_hash) is None:
+            page_images = asyncio.ensure_future(asyncio.to_thread(render_page_images, file_path, pdf_hash))
+        
+        # Slides are scheduled as chunks stream out of the chunk summary. The overall summary
+        # runs alongside and is picked up by slides that start after it arrives.
+        overall_summary = result_cache.get("overall_summary", pdf_hash, MODEL_NAME, OVERALL_SUMMARY_PROMPT)
+        if overall_summary is None:
+            overall_summary = asyncio.ensure_future(get_initial_summary(file_path))
+        chunk_feed, chunk_task = start_chunk_feed(file_path)
+        changed = None
+        if incremental:
+            changed = changed_pages(load_fingerprints(fingerprints_path_for(deck_id)), fingerprints)
+            logger.info(f"Incremental mode: {len(changed)} new or changed pages")
         
-        # Get overall summary and chunk data
-        overall_future = asyncio.to_thread(get_initial_summary, file_path)
-        chunk_future = asyncio.to_thread(get_chunk_summary, file_path)
-        overall_summary, structured_data = await asyncio.gather(overall_future, chunk_future)
+        logger.info("Generating unique explanations for each academic slide...")
+        live_structure = {"academic_context": "", "chunks": []}
+        slide_texts, all_slides, regenerated = await process_all_academic_slides(
+            overall_summary, live_structure, pdf_hash, slides=changed, deck_id=deck_id,
+            on_event=track, chunk_feed=chunk_feed, packed=packed, file_path=file_path, limiter=limiter,
+            attach_promoter=attach_promoter
+        )
+        structured_data = await chunk_task
+        if not isinstance(overall_summary, str):
+            try:
+                await overall_summary
+            except Exception as e:
+                # The summary is optional context; the slides were written without it
+                logger.error(f"Failed to generate overall summary: {truncate_log(str(e))}")
+        if page_images is not None:
+            try:
+                manifest = await page_images
+                logger.info(f"Rendered page images for {manifest['pages']} pages at widths {manifest['widths']}")
+            except Exception as e:
+                # The viewer falls back to rendering the PDF itself
+                logger.error(f"Failed to render page images: {truncate_log(str(e))}")
         
         if not structured_data.get('chunks'):
             logger.warning("No valid academic chunks found. Exiting.")
             return
         
-        logger.info("Generating unique explanations for each academic slide...")
-        await process_all_academic_slides(overall_summary, structured_data)
+        if incremental:
+            saved_calls = len(all_slides - regenerated)
+            logger.info(f"Incremental mode reused {saved_calls} of {len(all_slides)} slide summaries "
+                        f"({saved_calls} model calls saved)")
+        # Pages without a fresh summary keep their old fingerprint (or none), so the next
+        # incremental run still sees them as changed and retries them
+        previous = load_fingerprints(fingerprints_path_for(deck_id))
+        unfinished = {page for page in fingerprints
+                      if int(page) in failed or not slide_texts.get(page, {}).get('summary')}
+        save_fingerprints(fingerprints_path_for(deck_id), pdf_hash, {
+            page: previous[page] if page in unfinished else fingerprint
+            for page, fingerprint in fingerprints.items()
+            if page not in unfinished or page in previous
+        })
+        try:
+            await asyncio.to_thread(build_retrieval_index, file_path, deck_id, pdf_hash, structured_data)
+        except Exception as e:
+            logger.error(f"Failed to build retrieval index: {truncate_log(str(e))}")
+        
+        cache_stats = result_cache.stats()
+        logger.info(f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                    f"{cache_stats['evictions']} evictions")
+        logger.info(f"JSON parsing: {dict(repair_stats)}")
+        context_stats = context_cache.stats()
+        if context_stats['cached_calls']:
+            logger.info(f"Context cache: {context_stats['cached_calls']} calls read "
+                        f"{context_stats['cached_tokens']:,} prompt tokens from the cache "
+                        f"({context_stats['cached_share']:.0%} of prompt tokens) and sent "
+                        f"{context_stats['saved_tokens']:,} fewer tokens than uncached requests would have")
+        for line in call_metrics.summary():
+            logger.info(f"Model calls, {line}")
         
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         logger.info(f"===== PROCESS COMPLETE (Duration: {duration:.2f}s) =====")
+        return {
+            'deck_id': deck_id,
+            'slides': len(all_slides),
+            'regenerated': len(regenerated),
+            'successful': completed.get('successful', 0),
+            'failed': completed.get('failed', 0),
+            'duration': duration,
+        }
         
     except Exception as e:
         logger.error(f"Process failed: {truncate_log(str(e))}")
         raise
+    finally:
+        if isinstance(overall_summary, asyncio.Future):
+            # Don't leave the summary running, or its failure unretrieved, when the run ends early
+            if overall_summary.done():
+                if not overall_summary.cancelled():
+                    overall_summary.exception()
+            else:
+                overall_summary.cancel()
+        call_labels.reset(labels_token)
+        request_limiter.reset(limiter_token)
+        await close_run_client(opened_client)
+
+def collect_pdfs(paths):
+    """The given PDFs, with directories expanded to the PDFs directly inside them."""
+    pdfs = []
+    for path in map(pathlib.Path, paths):
+        if path.is_dir():
+            pdfs.extend(sorted(p for p in path.iterdir() if p.suffix.lower() == '.pdf'))
+        else:
+            pdfs.append(path)
+    return pdfs
+
+async def run_decks(pdf_paths, workers=2, incremental=False, packed=PACKED_SLIDES, render_pages=RENDER_PAGE_IMAGES):
+    """Process many decks, `workers` at a time, all drawing on one request budget.
+
+    Each deck's outputs are written under its deck id. Returns one summary per deck, with
+    an 'error' entry for decks that failed.
+    """
+    limiter = AdaptiveLimiter(**concurrency_for_model(MODEL_NAME))
+    queue = asyncio.Queue()
+    for path in pdf_paths:
+        queue.put_nowait(pathlib.Path(path))
+    results = []
+    started_at = time.monotonic()
+
+    async def worker():
+        while not queue.empty():
+            path = queue.get_nowait()
+            try:
+                summary = await main(path, incremental=incremental, packed=packed, limiter=limiter,
+                                     render_pages=render_pages)
+                results.append(summary or {'deck_id': deck_id_for(path), 'error': "no chunks found"})
+            except Exception as e:
+                results.append({'deck_id': deck_id_for(path), 'error': str(e)})
+
+    # The decks share one async client; workers inherit it from here
+    opened_client = open_run_client()
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(pdf_paths))))))
+    finally:
+        await close_run_client(opened_client)
+    elapsed = time.monotonic() - started_at
+
+    done = [r for r in results if 'error' not in r]
+    generated = sum(r['successful'] for r in done)
+    failed_slides = sum(r['failed'] for r in done)
+    logger.info("===== BATCH SUMMARY =====")
+    for r in sorted(results, key=lambda r: r['deck_id']):
+        if 'error' in r:
+            logger.info(f"{r['deck_id']}: FAILED ({truncate_log(r['error'])})")
+        else:
+            logger.info(f"{r['deck_id']}: {r['slides']} slides, {r['successful']} generated, "
+                        f"{r['failed']} failed in {r['duration']:.1f}s")
+    logger.info(f"{len(done)} of {len(results)} decks processed with {workers} workers in {elapsed:.1f}s: "
+                f"{generated} slides generated ({failed_slides} failed), "
+                f"{60 * generated / elapsed if elapsed else 0.0:.1f} slides/min, "
+                f"{60 * len(done) / elapsed if elapsed else 0.0:.2f} decks/min; "
+                f"final concurrency limit {int(limiter.limit)}")
+    return results
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Summarize slide decks with Gemini")
+    parser.add_argument("pdfs", nargs="*", default=[DEFAULT_PDF_PATH],
+                        help="PDFs or directories of PDFs to summarize (default: $PDF_PATH)")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="decks processed at the same time; they share one request budget")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only regenerate slides that changed since the last run")
+    parser.add_argument("--packed", action="store_true", default=PACKED_SLIDES,
+                        help="explain several slides per request (see SLIDE_BATCH_TOKENS)")
+    parser.add_argument("--render-pages", action="store_true", default=RENDER_PAGE_IMAGES,
+                        help="pre-render page images for the viewer (see RENDER_PAGE_IMAGES)")
+    args = parser.parse_args()
+    pdfs = collect_pdfs(args.pdfs)
+    if not pdfs:
+        parser.error("no PDFs found")
+    deck_ids = [deck_id_for(pdf) for pdf in pdfs]
+    duplicates = sorted({d for d in deck_ids if deck_ids.count(d) > 1})
+    if duplicates:
+        # Outputs are keyed by deck id, so two decks with the same file name would overwrite each other
+        parser.error(f"several PDFs share the deck id(s) {', '.join(duplicates)}; rename them")
+    results = asyncio.run(run_decks(pdfs, workers=args.workers, incremental=args.incremental, packed=args.packed,
+                                    render_pages=args.render_pages))
+    if any('error' in r for r in results):
+        raise SystemExit(1)
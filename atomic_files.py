@@ -0,0 +1,37 @@
+import contextlib
+import os
+import pathlib
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """A temporary path to write `path`'s new contents to; it replaces `path` when the block ends.
+
+    The temporary file sits next to `path` under a unique name, so concurrent writers of
+    the same file never share one and readers only ever see a complete file. If the block
+    raises, the temporary file is removed and `path` is left as it was.
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    os.close(fd)
+    try:
+        yield pathlib.Path(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def write_atomic(path, data, fsync=False):
+    """Replace `path` with `data` (str or bytes) in one step; with `fsync`, flushed to disk first."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymupdf
+
+from metrics import percentile
+
+TOPICS = [
+    "Disk-Oriented Architecture", "Storage Hierarchy", "File Storage", "Database Pages",
+    "Heap Files", "Page Layout", "Slotted Pages", "Tuple Layout", "Log-Structured Storage",
+    "Data Representation", "System Catalogs", "Buffer Pool Management",
+]
+QUESTIONS = [
+    "Why does the database manage its own buffer pool instead of relying on the OS?",
+    "What is the difference between a slotted page and a log-structured layout?",
+    "How are variable-length tuples stored on a page?",
+    "When would a heap file be a poor choice?",
+    "What does the page directory keep track of?",
+]
+# Metrics compared against a saved baseline, and whether a larger value is better
+METRICS = {
+    'pipeline.slides_per_second': True,
+    'pipeline.seconds': False,
+    'pipeline.model_calls': False,
+    'pipeline.rerun_model_calls': False,
+    'ask.requests_per_second': True,
+    'ask.p50_ms': False,
+    'ask.p90_ms': False,
+    'ask.p99_ms': False,
+    'ask.model_calls': False,
+}
+
+
+def make_deck(path, pages):
+    """A synthetic lecture deck: one topic every few pages, each page a title and some bullets."""
+    with pymupdf.open() as doc:
+        for i in range(pages):
+            topic = TOPICS[(i // 3) % len(TOPICS)]
+            page = doc.new_page()
+            page.insert_text((72, 90), f"{topic} ({i + 1})", fontsize=24)
+            for line in range(5):
+                page.insert_text((72, 150 + 30 * line),
+                                 f"* Point {line + 1} about {topic.lower()} on slide {i + 1}", fontsize=14)
+        doc.save(path)
+
+
+def fake_settings(args):
+    return {
+        'FAKE_GEMINI_LATENCY': str(args.latency),
+        'FAKE_GEMINI_LATENCY_SIGMA': str(args.latency_sigma),
+        'FAKE_GEMINI_TOKENS_PER_SECOND': str(args.tokens_per_second),
+        'FAKE_GEMINI_UPLOAD_SECONDS': str(args.upload_seconds),
+        'FAKE_GEMINI_429_RATE': str(args.throttle_rate),
+        'FAKE_GEMINI_5XX_RATE': str(args.server_error_rate),
+        'FAKE_GEMINI_TRUNCATE_RATE': str(args.truncate_rate),
+        'FAKE_GEMINI_MAX_CONCURRENCY': str(args.max_concurrency),
+        'FAKE_GEMINI_SEED': str(args.seed),
+    }
+
+
+def run_pipeline(app, pdf_path, packed):
+    """Process the deck from scratch, then again with everything cached.
+
+    A run that fails, e.g. on faults it could not retry away, is reported with its error
+    instead of the rates and the rerun.
+    """
+    client = app.client
+    client.reset_stats()
+    completed = {}
+
+    def on_event(event, data):
+        if event == 'completed':
+            completed.update(data)
+
+    started = time.monotonic()
+    try:
+        summary = asyncio.run(app.main(pdf_path, on_event=on_event, packed=packed))
+    except Exception as e:
+        cold = client.stats()
+        return {
+            'error': f"{type(e).__name__}: {e}",
+            'seconds': round(time.monotonic() - started, 3),
+            'model_calls': cold['total_calls'],
+            'calls_by_kind': cold['calls'],
+            'faults': {str(code): count for code, count in cold['faults'].items()},
+        }
+    seconds = time.monotonic() - started
+    cold = client.stats()
+
+    # A rerun of an unchanged deck should be served entirely from the result cache
+    client.reset_stats()
+    asyncio.run(app.main(pdf_path, packed=packed))
+    rerun = client.stats()
+
+    slide_seconds = completed.get('duration') or seconds
+    return {
+        'slides': summary['slides'] if summary else 0,
+        'failed': summary['failed'] if summary else 0,
+        'seconds': round(seconds, 3),
+        # process_all_academic_slides alone, from its first slide to its last
+        'slide_seconds': round(slide_seconds, 3),
+        'slides_per_second': round(summary['successful'] / slide_seconds, 3) if summary else 0.0,
+        'model_calls': cold['total_calls'],
+        'calls_by_kind': cold['calls'],
+        'faults': {str(code): count for code, count in cold['faults'].items()},
+        'uploads': cold['uploads'],
+        'peak_in_flight': cold['peak_in_flight'],
+        'rerun_model_calls': rerun['total_calls'],
+    }
+
+
+def run_questions(server, page_total, questions, concurrency):
+    """Ask distinct questions about every slide in turn, `concurrency` at a time."""
+    client = server.client
+    client.reset_stats()
+
+    def ask(i):
+        body = {
+            'question': f"{QUESTIONS[i % len(QUESTIONS)]} (#{i})",
+            'currentSlide': i % page_total + 1,
+        }
+        started = time.perf_counter()
+        response = server.app.test_client().post('/ask_gemini', json=body)
+        return time.perf_counter() - started, response.status_code == 200 and response.get_json()['success']
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(ask, range(questions)))
+    seconds = time.monotonic() - started
+    latencies = [latency * 1000 for latency, _ in results]
+    stats = client.stats()
+    return {
+        'requests': questions,
+        'errors': sum(1 for _, ok in results if not ok),
+        'requests_per_second': round(questions / seconds, 3),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p90_ms': round(percentile(latencies, 90), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'model_calls': stats['total_calls'],
+        'faults': {str(code): count for code, count in stats['faults'].items()},
+    }
+
+
+def run(args, workdir):
+    workdir = pathlib.Path(workdir)
+    pdf_path = workdir / "benchmark-deck.pdf"
+    make_deck(pdf_path, args.pages)
+    # The app reads its settings at import, so the fake backend and paths are set up first
+    os.environ.update(fake_settings(args))
+    os.environ.update({
+        'GEMINI_BACKEND': "fake",
+        'GEMINI_API_KEY': os.getenv("GEMINI_API_KEY") or "benchmark",
+        'PDF_PATH': str(pdf_path),
+        'PDFSUMMARIZER_CACHE_DIR': str(workdir / ".cache"),
+    })
+    os.chdir(workdir)
+    import app
+    if not args.verbose:
+        for handler in app.log_listener.handlers:
+            if type(handler) is logging.StreamHandler:
+                handler.setLevel(logging.WARNING)
+
+    results = {'pipeline': run_pipeline(app, pdf_path, args.packed)}
+    # The web app picks up the slides and retrieval index the pipeline just wrote
+    import server
+    results['ask'] = run_questions(server, args.pages, args.questions, args.concurrency)
+    return results
+
+
+def flatten(results):
+    values = {}
+    for name in METRICS:
+        section, key = name.split('.')
+        values[name] = results.get(section, {}).get(key)
+    return values
+
+
+def compare(results, baseline, tolerance):
+    """Print each metric next to the baseline; returns the names of those that got worse by more than tolerance."""
+    regressions = []
+    current, previous = flatten(results), flatten(baseline)
+    print(f"\n{'metric':<30}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, higher_is_better in METRICS.items():
+        new, old = current[name], previous[name]
+        if new is None or old is None:
+            continue
+        change = f"{(new - old) / old:+.0%}" if old else ("+inf" if new else "0%")
+        if higher_is_better:
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance)
+        if worse:
+            regressions.append(name)
+        print(f"{name:<30}{old:>12}{new:>12}{change:>10}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def print_report(results, settings):
+    pipeline, ask = results['pipeline'], results['ask']
+    print(f"\nFake backend: {', '.join(f'{k}={v}' for k, v in settings.items())}")
+    if 'error' in pipeline:
+        print(f"Pipeline: FAILED after {pipeline['seconds']:.2f}s: {pipeline['error']}")
+        print(f"  model calls: {pipeline['model_calls']} {pipeline['calls_by_kind']}, faults {pipeline['faults']}")
+    else:
+        print(f"Pipeline: {pipeline['slides']} slides ({pipeline['failed']} failed) in {pipeline['seconds']:.2f}s; "
+              f"slides {pipeline['slide_seconds']:.2f}s at {pipeline['slides_per_second']:.2f} slides/s")
+        print(f"  model calls: {pipeline['model_calls']} {pipeline['calls_by_kind']}, faults {pipeline['faults']}, "
+              f"peak in flight {pipeline['peak_in_flight']}, rerun calls {pipeline['rerun_model_calls']}")
+    print(f"/ask_gemini: {ask['requests']} requests ({ask['errors']} errors) at {ask['requests_per_second']:.1f}/s; "
+          f"p50 {ask['p50_ms']:.0f}ms, p90 {ask['p90_ms']:.0f}ms, p99 {ask['p99_ms']:.0f}ms; "
+          f"{ask['model_calls']} model calls, faults {ask['faults']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline and /ask_gemini against a fake Gemini")
+    parser.add_argument("--pages", type=int, default=30, help="pages in the synthetic deck")
+    parser.add_argument("--packed", action="store_true", help="explain several slides per request")
+    parser.add_argument("--questions", type=int, default=40, help="questions sent to /ask_gemini")
+    parser.add_argument("--concurrency", type=int, default=8, help="questions in flight at once")
+    parser.add_argument("--latency", type=float, default=0.3, help="median seconds to the first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="spread of the lognormal latency")
+    parser.add_argument("--tokens-per-second", type=float, default=400, help="generation speed after the first token")
+    parser.add_argument("--upload-seconds", type=float, default=0.5, help="median seconds per file upload")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of calls rejected with 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="share of calls failing with 503")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="share of JSON responses cut short")
+    parser.add_argument("--max-concurrency", type=int, default=0,
+                        help="calls in flight above this get 429 (0: no limit)")
+    parser.add_argument("--seed", type=int, default=7, help="seed for latencies and faults")
+    parser.add_argument("--save-baseline", metavar="FILE", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare with a baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="relative change allowed before a metric counts as regressed")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's log output")
+    args = parser.parse_args()
+    settings = {**fake_settings(args), 'pages': args.pages, 'packed': args.packed,
+                'questions': args.questions, 'concurrency': args.concurrency}
+    baseline_path = pathlib.Path(args.compare).resolve() if args.compare else None
+    save_path = pathlib.Path(args.save_baseline).resolve() if args.save_baseline else None
+
+    # Everything the run writes (caches, slide store, logs) stays in a scratch directory
+    with tempfile.TemporaryDirectory(prefix="pdfsummarizer-bench-") as workdir:
+        results = run(args, workdir)
+        os.chdir(pathlib.Path(__file__).resolve().parent)
+    print_report(results, settings)
+    if 'error' in results['pipeline']:
+        # Nothing to save or compare; the metrics of a failed run are meaningless
+        sys.exit(1)
+
+    if save_path:
+        with open(save_path, 'w') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=4)
+        print(f"\nBaseline written to {save_path}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print("\nWarning: the baseline was recorded with different settings; the comparison may not be meaningful")
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions")
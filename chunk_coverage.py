@@ -0,0 +1,113 @@
+def coverage_gaps(chunks, page_count):
+    """Pages no chunk lists, and pages listed by more than one chunk (page -> chunk indexes)."""
+    listed = {}
+    for idx, chunk in enumerate(chunks):
+        for sn in chunk['slide_numbers']:
+            if 1 <= sn <= page_count and idx not in listed.setdefault(sn, []):
+                listed[sn].append(idx)
+    missing = [sn for sn in range(1, page_count + 1) if sn not in listed]
+    duplicates = {sn: idxs for sn, idxs in sorted(listed.items()) if len(idxs) > 1}
+    return missing, duplicates
+
+
+def _slide_pairs(chunk):
+    """(slide number, slide text or None) pairs; texts are only kept when they line up with the numbers."""
+    slides = chunk.get('slides') or []
+    numbers = chunk['slide_numbers']
+    if len(slides) == len(numbers):
+        return list(zip(numbers, slides))
+    return [(sn, None) for sn in numbers]
+
+
+def _rebuild(chunk, pairs):
+    if all(text is not None for _, text in pairs):
+        slides = [text for _, text in pairs]
+    else:
+        slides = chunk.get('slides') or []
+    return {**chunk, 'slides': slides, 'slide_numbers': [sn for sn, _ in pairs]}
+
+
+def clip_chunk(chunk, page_count):
+    """The chunk without slide numbers the deck doesn't have (and their slide texts)."""
+    if all(1 <= sn <= page_count for sn in chunk['slide_numbers']):
+        return chunk
+    return _rebuild(chunk, [(sn, text) for sn, text in _slide_pairs(chunk) if 1 <= sn <= page_count])
+
+
+def _nearest_chunk(sn, owner):
+    """Index of the chunk holding the closest earlier slide, else the closest later one."""
+    earlier = [p for p in owner if p < sn]
+    if earlier:
+        return owner[max(earlier)]
+    later = [p for p in owner if p > sn]
+    return owner[min(later)] if later else None
+
+
+def apply_assignments(chunks, page_count, assignments):
+    """Fold the follow-up call's assignments into the chunk list.
+
+    assignments is a list of {"slide_number", "chunk" (an existing chunk index or null),
+    "topic", "content"}. A duplicated page stays only in its assigned chunk (its first
+    chunk if the assignment is unusable). A missing page goes with its assigned chunk, a
+    new chunk for its topic, or failing both the chunk of its nearest neighbour.
+
+    Returns (chunks, follow_ups): the complete chunk list, and the chunks holding just the
+    newly covered pages (also at the end of the list), ready to be scheduled.
+    """
+    missing, duplicates = coverage_gaps(chunks, page_count)
+    by_slide = {}
+    for item in assignments or []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            sn = int(item.get('slide_number'))
+        except (TypeError, ValueError):
+            continue
+        by_slide.setdefault(sn, item)
+
+    def assigned_chunk(sn):
+        try:
+            idx = int(by_slide.get(sn, {}).get('chunk'))
+        except (TypeError, ValueError):
+            return None
+        return idx if 0 <= idx < len(chunks) else None
+
+    # Settle which chunk keeps each duplicated page
+    keep = {sn: assigned_chunk(sn) if assigned_chunk(sn) in idxs else idxs[0] for sn, idxs in duplicates.items()}
+    result = []
+    for idx, chunk in enumerate(chunks):
+        chunk = clip_chunk(chunk, page_count)
+        if any(keep.get(sn, idx) != idx for sn in chunk['slide_numbers']):
+            chunk = _rebuild(chunk, [(sn, text) for sn, text in _slide_pairs(chunk) if keep.get(sn, idx) == idx])
+        result.append(chunk)
+
+    owner = {sn: idx for idx, chunk in enumerate(result) for sn in chunk['slide_numbers']}
+    added = {}       # existing chunk index -> [(slide number, text)]
+    new_topics = {}  # topic -> [(slide number, text)]
+    for sn in missing:
+        item = by_slide.get(sn, {})
+        text = str(item.get('content') or '')
+        idx = assigned_chunk(sn)
+        topic = str(item.get('topic') or '').strip()
+        if idx is None and topic:
+            new_topics.setdefault(topic, []).append((sn, text))
+            continue
+        if idx is None:
+            idx = _nearest_chunk(sn, owner)
+        if idx is None:
+            new_topics.setdefault('Uncategorized slides', []).append((sn, text))
+            continue
+        added.setdefault(idx, []).append((sn, text))
+
+    # Newly covered pages get chunks of their own, sharing the topic of the chunk they joined,
+    # so the chunks already used to summarize other slides stay exactly as they were
+    follow_ups = [_rebuild(result[idx], extra) for idx, extra in sorted(added.items())]
+    for topic, extra in new_topics.items():
+        follow_ups.append({
+            'topic': topic,
+            'pedagogical_goal': '',
+            'slides': [text for _, text in extra],
+            'slide_numbers': [sn for sn, _ in extra],
+            'is_logistics': False,
+        })
+    return [chunk for chunk in result if chunk['slide_numbers']] + follow_ups, follow_ups
@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from google.genai import types
+
+from metrics import call_metrics
+from packing import estimate_tokens
+
+logger = logging.getLogger('pdfsummarizer')
+
+# Cached contents live this long unless they are used again, which extends them
+CACHE_TTL = timedelta(hours=1)
+# Extend or recreate a cache this long before it expires so in-flight calls don't race it
+REFRESH_MARGIN = timedelta(minutes=5)
+# After a failed create, calls go uncached for this long before trying again
+FAILURE_BACKOFF = timedelta(minutes=10)
+# Explicit caching needs a pinned model version
+CACHE_MODELS = {
+    "gemini-2.0-flash": "gemini-2.0-flash-001",
+    "gemini-2.0-flash-lite": "gemini-2.0-flash-lite-001",
+    "gemini-1.5-pro": "gemini-1.5-pro-002",
+}
+
+# file_tokens: the part of the cache taken by the PDF, which questions would otherwise upload
+ContextHandle = namedtuple('ContextHandle', ['name', 'model', 'tokens', 'file_tokens'])
+
+
+def summary_prefix(summary):
+    return f"Overall summary of the lecture:\n{summary}"
+
+
+class _PendingCache:
+    def __init__(self):
+        self.done = threading.Event()
+        self.handle = None
+
+
+class ContextCacheRegistry:
+    """One Gemini cached-content handle per (deck, model, overall summary).
+
+    The handle holds the uploaded PDF and the overall summary so per-slide and question
+    requests only send their own small suffix. Slide requests made this way see the PDF,
+    which their uncached prompt doesn't include. Creation is shared by concurrent callers;
+    if caching is unavailable (unsupported model, deck below the minimum token count,
+    quota) get() returns None and callers send the full prompt instead.
+    """
+
+    def __init__(self, ttl=CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}   # key -> (ContextHandle, expires_at)
+        self._pending = {}   # key -> _PendingCache
+        self._failed = {}    # key -> retry_after
+        self.created = 0
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.saved_tokens = 0
+
+    @staticmethod
+    def _key(pdf_hash, model, summary):
+        return (pdf_hash, model, hashlib.sha256(summary.encode('utf-8')).hexdigest())
+
+    def get(self, client, pdf_hash, model, summary, remote_file):
+        """The live handle for this deck and summary, creating it if needed; None if caching is unavailable.
+
+        remote_file is a callable returning the uploaded PDF, only called when a cache is created.
+        """
+        if model not in CACHE_MODELS or not summary:
+            return None
+        key = self._key(pdf_hash, model, summary)
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            if self._failed.get(key, now) > now:
+                return None
+            entry = self._entries.get(key)
+            if entry and entry[1] - REFRESH_MARGIN > now:
+                return entry[0]
+            pending = self._pending.get(key)
+            is_creator = pending is None
+            if is_creator:
+                pending = _PendingCache()
+                self._pending[key] = pending
+
+        if not is_creator:
+            pending.done.wait()
+            return pending.handle
+
+        handle = None
+        try:
+            if entry:
+                handle = self._extend(client, entry[0])
+            if handle is None:
+                handle = self._create(client, model, summary, remote_file)
+        except Exception as e:
+            logger.warning(f"Context caching unavailable, sending full prompts: {e}")
+        finally:
+            with self._lock:
+                if handle is not None:
+                    self._entries[key] = (handle, datetime.now(timezone.utc) + self.ttl)
+                    self._failed.pop(key, None)
+                else:
+                    self._entries.pop(key, None)
+                    self._failed[key] = datetime.now(timezone.utc) + FAILURE_BACKOFF
+                del self._pending[key]
+            pending.handle = handle
+            pending.done.set()
+        return handle
+
+    def _create(self, client, model, summary, remote_file):
+        contents = [remote_file(), summary_prefix(summary)]
+        with call_metrics.timed('cache_create', CACHE_MODELS[model]):
+            cache = client.caches.create(
+                model=CACHE_MODELS[model],
+                config=types.CreateCachedContentConfig(
+                    contents=contents,
+                    ttl=f"{int(self.ttl.total_seconds())}s",
+                    display_name="pdfsummarizer deck",
+                )
+            )
+        tokens = getattr(cache.usage_metadata, 'total_token_count', None) or 0
+        with self._lock:
+            self.created += 1
+        logger.info(f"Created context cache {cache.name} ({tokens} tokens)")
+        file_tokens = max(0, tokens - estimate_tokens(summary_prefix(summary)))
+        return ContextHandle(cache.name, CACHE_MODELS[model], tokens, file_tokens)
+
+    def _extend(self, client, handle):
+        try:
+            client.caches.update(
+                name=handle.name,
+                config=types.UpdateCachedContentConfig(ttl=f"{int(self.ttl.total_seconds())}s")
+            )
+            return handle
+        except Exception as e:
+            logger.info(f"Could not extend context cache {handle.name}, creating a new one: {e}")
+            return None
+
+    def invalidate(self, handle):
+        """Forget a handle Gemini no longer knows about (deleted or expired early)."""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry[0] == handle:
+                    del self._entries[key]
+
+    def config(self, handle, **kwargs):
+        return types.GenerateContentConfig(cached_content=handle.name, **kwargs)
+
+    def record_usage(self, handle, response, saved_tokens):
+        """Count a cached call.
+
+        saved_tokens is how many fewer tokens it sent than the same request without the
+        cache would have; the whole cached prefix only counts where that request would
+        have carried all of it.
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        cached = getattr(usage, 'cached_content_token_count', None) or handle.tokens
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += getattr(usage, 'prompt_token_count', None) or 0
+            self.cached_tokens += cached
+            self.saved_tokens += max(0, saved_tokens)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'caches_created': self.created,
+                'live_caches': len(self._entries),
+                'cached_calls': self.calls,
+                'prompt_tokens': self.prompt_tokens,
+                'cached_tokens': self.cached_tokens,
+                # Cached tokens are billed at a discount rather than free; this is the share of
+                # prompt tokens served from the cache
+                'cached_share': self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                # Tokens the same requests would have sent without the cache, less what they did send
+                'saved_tokens': self.saved_tokens,
+            }
+
+
+context_cache = ContextCacheRegistry()
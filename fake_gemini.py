@@ -0,0 +1,440 @@
+import asyncio
+import json
+import math
+import os
+import pathlib
+import random
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pymupdf
+from google.genai import errors
+
+from json_repair import extract_json
+from packing import estimate_tokens
+
+# Gemini counts each PDF page as this many input tokens
+TOKENS_PER_PAGE = 258
+# Smallest prompt Gemini accepts for explicit context caching
+MIN_CACHE_TOKENS = 4096
+FILE_LIFETIME = timedelta(hours=48)
+STREAM_PIECE_CHARS = 200
+# Pages per chunk in fake chunk summaries
+CHUNK_PAGES = 4
+# Responses that are meant to be JSON and so can come back truncated
+TRUNCATABLE = {'chunks', 'coverage', 'slide_batch'}
+
+# One planned model call: how long until the first token, how long the rest takes to
+# generate, and either the error it fails with or the response it returns
+_Call = namedtuple('_Call', ['kind', 'wait', 'generating', 'error', 'response'])
+
+
+class FakeFile:
+    """What files.upload() returns: a handle to an uploaded PDF, here with its page texts."""
+
+    def __init__(self, name, path, texts):
+        self.name = name
+        self.uri = f"https://fake-gemini.local/v1beta/{name}"
+        self.mime_type = "application/pdf"
+        self.path = path
+        self.texts = texts
+        self.expiration_time = datetime.now(timezone.utc) + FILE_LIFETIME
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+def api_error(code, status, message):
+    payload = {'error': {'code': code, 'message': message, 'status': status}}
+    if code >= 500:
+        return errors.ServerError(code, payload)
+    return errors.ClientError(code, payload)
+
+
+def _first_line(text):
+    return next((line.strip() for line in text.splitlines() if line.strip()), '')
+
+
+def _numbers(text):
+    return [int(n) for n in re.findall(r'\d+', text)]
+
+
+def classify(text):
+    """Which of the app's prompts `text` is, judged by the phrases each one contains."""
+    head = text.lstrip()[:200]
+    if 'was meant to be valid JSON' in head:
+        return 'json_fix'
+    if head.startswith('This is a question'):
+        return 'answer'
+    if '"assignments"' in text:
+        return 'coverage'
+    if '"chunks"' in text:
+        return 'chunks'
+    if re.search(r'Analyze slides \d', text):
+        return 'slide_batch'
+    if re.search(r'Analyze slide \d', text):
+        return 'slide'
+    if 'summarize each page' in text.lower():
+        return 'summary'
+    return 'answer'
+
+
+def explanation(slide_number, paragraphs=6):
+    points = "\n".join(
+        f"* **Point {i}**: how slide {slide_number} builds on the storage concepts introduced so far, "
+        f"with an example of the trade-off it describes."
+        for i in range(1, paragraphs + 1)
+    )
+    return (f"# Slide {slide_number}: Key Ideas\n\n"
+            f"This slide explains a core part of the lecture's argument.\n\n{points}\n\n"
+            f"Together these points connect slide {slide_number} to the rest of the lecture.")
+
+
+def respond(kind, text, texts):
+    """The fake model's answer to a prompt of the given kind; `texts` are the attached pages."""
+    if kind == 'summary':
+        if not texts:
+            return "A lecture on database systems."
+        return "\n".join(f"Page {i}: {_first_line(t) or 'Untitled'}" for i, t in enumerate(texts, 1))
+    if kind == 'chunks':
+        chunks = []
+        for start in range(0, len(texts), CHUNK_PAGES):
+            group = texts[start:start + CHUNK_PAGES]
+            topic = _first_line(group[0]) or f"Part {len(chunks) + 1}"
+            chunks.append({
+                'topic': topic,
+                'pedagogical_goal': f"Understand {topic}",
+                'slides': [' '.join(t.split())[:200] for t in group],
+                'slide_numbers': list(range(start + 1, start + len(group) + 1)),
+                'is_logistics': False,
+            })
+        return json.dumps({'academic_context': "A lecture on database systems.", 'chunks': chunks}, indent=2)
+    if kind == 'coverage':
+        match = re.search(r'contains slides ([\d, ]+) of a lecture', text)
+        pages = _numbers(match.group(1)) if match else []
+        listed = [(int(idx), _numbers(nums)) for idx, nums in
+                  re.findall(r'^\s*(\d+): .*\(slides ([\d, ]*)\)\s*$', text, re.MULTILINE)]
+        assignments = []
+        for position, sn in enumerate(pages):
+            owners = [idx for idx, nums in listed if sn in nums]
+            nearest = min(listed, key=lambda item: min((abs(n - sn) for n in item[1]), default=math.inf),
+                          default=None)
+            chunk = owners[0] if owners else (nearest[0] if nearest else None)
+            assignments.append({
+                'slide_number': sn,
+                'chunk': chunk,
+                'topic': "Additional material" if chunk is None else "",
+                'content': texts[position] if position < len(texts) else "",
+            })
+        return json.dumps({'assignments': assignments}, indent=2)
+    if kind == 'slide_batch':
+        match = re.search(r'Analyze slides ([\d, ]+)', text)
+        slides = [{'slide_number': sn, 'title': f"Slide {sn}: Key Ideas", 'explanation': explanation(sn)}
+                  for sn in _numbers(match.group(1))]
+        return json.dumps({'slides': slides}, indent=2)
+    if kind == 'slide':
+        return explanation(int(re.search(r'Analyze slide (\d+)', text).group(1)))
+    if kind == 'json_fix':
+        payload = text.split('preserving all the information:', 1)[-1].rsplit('Return ONLY', 1)[0]
+        try:
+            return json.dumps(extract_json(payload), indent=2)
+        except ValueError:
+            return payload.strip()
+    question = re.search(r'Question: (.*)', text)
+    slide = re.search(r'about slide (\d+)', text)
+    return (f"## Answer\n\nSlide {slide.group(1) if slide else 1} addresses *"
+            f"{question.group(1).strip() if question else 'this question'}* directly.\n\n"
+            f"* It introduces the idea in context.\n* The surrounding slides give an example.")
+
+
+class FakeClient:
+    """Local stand-in for genai.Client that simulates Gemini's timing and failures.
+
+    Prompts are recognised by their wording and answered with well-formed output sized
+    like the real thing. Latency to the first token is lognormal around `latency`
+    seconds, and generation then takes output tokens / `tokens_per_second`. Calls fail
+    with 429 at `throttle_rate` (and whenever more than `max_concurrency` are in flight),
+    with 503 at `server_error_rate`, and JSON responses are cut short at `truncate_rate`.
+    Uploads take about `upload_seconds`. Every call is counted by prompt kind.
+    """
+
+    def __init__(self, latency=0.5, latency_sigma=0.4, tokens_per_second=400, upload_seconds=2.0,
+                 throttle_rate=0.0, server_error_rate=0.0, truncate_rate=0.0, max_concurrency=0,
+                 seed=None):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.upload_seconds = upload_seconds
+        self.throttle_rate = throttle_rate
+        self.server_error_rate = server_error_rate
+        self.truncate_rate = truncate_rate
+        self.max_concurrency = max_concurrency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._files = {}    # name -> FakeFile
+        self._caches = {}   # name -> cached content
+        self._in_flight = 0
+        self.models = _Models(self)
+        self.aio = SimpleNamespace(models=_AsyncModels(self))
+        self.files = _Files(self)
+        self.caches = _Caches(self)
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls):
+        seed = os.getenv("FAKE_GEMINI_SEED")
+        return cls(
+            latency=float(os.getenv("FAKE_GEMINI_LATENCY", "0.5")),
+            latency_sigma=float(os.getenv("FAKE_GEMINI_LATENCY_SIGMA", "0.4")),
+            tokens_per_second=float(os.getenv("FAKE_GEMINI_TOKENS_PER_SECOND", "400")),
+            upload_seconds=float(os.getenv("FAKE_GEMINI_UPLOAD_SECONDS", "2.0")),
+            throttle_rate=float(os.getenv("FAKE_GEMINI_429_RATE", "0")),
+            server_error_rate=float(os.getenv("FAKE_GEMINI_5XX_RATE", "0")),
+            truncate_rate=float(os.getenv("FAKE_GEMINI_TRUNCATE_RATE", "0")),
+            max_concurrency=int(os.getenv("FAKE_GEMINI_MAX_CONCURRENCY", "0")),
+            seed=int(seed) if seed else None,
+        )
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = Counter()
+            self.faults = Counter()
+            self.uploads = 0
+            self.caches_created = 0
+            self.peak_in_flight = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'total_calls': sum(self.calls.values()),
+                'faults': dict(self.faults),
+                'uploads': self.uploads,
+                'caches_created': self.caches_created,
+                'peak_in_flight': self.peak_in_flight,
+            }
+
+    def _lognormal(self, median):
+        with self._lock:
+            return median * math.exp(self.latency_sigma * self._random.gauss(0, 1))
+
+    def _draw(self):
+        with self._lock:
+            return self._random.random()
+
+    def _resolve(self, model, contents, config):
+        """The prompt text and attached page texts of a call, or the error Gemini would give."""
+        parts = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+        now = datetime.now(timezone.utc)
+        cache_name = getattr(config, 'cached_content', None)
+        if cache_name:
+            with self._lock:
+                cache = self._caches.get(cache_name)
+            if cache is None or cache.expire_time <= now:
+                return None, None, 0, api_error(404, 'NOT_FOUND', f"CachedContent not found: {cache_name}")
+            if cache.model != model:
+                return None, None, 0, api_error(400, 'INVALID_ARGUMENT', "Model does not match the cached content")
+            parts = cache.contents + parts
+        texts = []
+        prompt = []
+        file_tokens = 0
+        for part in parts:
+            if isinstance(part, str):
+                prompt.append(part)
+                continue
+            handle = self._file(part)
+            if handle is None or handle.expiration_time <= now:
+                return None, None, 0, api_error(
+                    403, 'PERMISSION_DENIED',
+                    f"You do not have permission to access the File {getattr(part, 'name', part)}"
+                )
+            texts.extend(handle.texts)
+            file_tokens += TOKENS_PER_PAGE * len(handle.texts)
+        return "\n".join(prompt), texts, file_tokens, None
+
+    def _file(self, part):
+        """The upload a content part refers to; SDK configs turn FakeFile into types.File, so look it up by name."""
+        with self._lock:
+            return self._files.get(getattr(part, 'name', None))
+
+    def _plan(self, model, contents, config):
+        text, texts, file_tokens, error = self._resolve(model, contents, config)
+        kind = classify(text) if error is None else 'rejected'
+        with self._lock:
+            self.calls[kind] += 1
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+            overloaded = self.max_concurrency and self._in_flight > self.max_concurrency
+        if error is None:
+            draw = self._draw()
+            if overloaded or draw < self.throttle_rate:
+                error = api_error(429, 'RESOURCE_EXHAUSTED', "Resource has been exhausted (e.g. check quota).")
+            elif draw < self.throttle_rate + self.server_error_rate:
+                error = api_error(503, 'UNAVAILABLE', "The model is overloaded. Please try again later.")
+        if error is not None:
+            with self._lock:
+                self.faults[error.code] += 1
+            # Rejections come back quickly
+            return _Call(kind, self._lognormal(self.latency) * 0.1, 0.0, error, None)
+
+        output = respond(kind, text, texts)
+        if kind in TRUNCATABLE and self._draw() < self.truncate_rate:
+            with self._lock:
+                self.faults['truncated'] += 1
+            output = output[:int(len(output) * (0.3 + 0.6 * self._draw()))]
+        cached_tokens = 0
+        if getattr(config, 'cached_content', None):
+            with self._lock:
+                cached_tokens = self._caches[config.cached_content].tokens
+        output_tokens = estimate_tokens(output)
+        usage = SimpleNamespace(
+            prompt_token_count=file_tokens + estimate_tokens(text),
+            cached_content_token_count=cached_tokens or None,
+            candidates_token_count=output_tokens,
+            total_token_count=file_tokens + estimate_tokens(text) + output_tokens,
+        )
+        generating = output_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+        return _Call(kind, self._lognormal(self.latency), generating, None, FakeResponse(output, usage))
+
+    def _finish(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    @staticmethod
+    def _pieces(response):
+        text = response.text
+        pieces = [FakeResponse(text[i:i + STREAM_PIECE_CHARS])
+                  for i in range(0, len(text), STREAM_PIECE_CHARS)] or [FakeResponse('')]
+        pieces[-1].usage_metadata = response.usage_metadata
+        return pieces
+
+    def _upload(self, path):
+        path = pathlib.Path(path)
+        with pymupdf.open(path) as doc:
+            texts = [page.get_text() for page in doc]
+        with self._lock:
+            self.uploads += 1
+            handle = FakeFile(f"files/fake-{self.uploads}", path, texts)
+            self._files[handle.name] = handle
+        return handle
+
+    def _create_cache(self, model, config):
+        contents = list(config.contents or [])
+        tokens = sum(estimate_tokens(part) if isinstance(part, str) else TOKENS_PER_PAGE * len(self._file(part).texts)
+                     for part in contents if isinstance(part, str) or self._file(part) is not None)
+        if tokens < MIN_CACHE_TOKENS:
+            raise api_error(400, 'INVALID_ARGUMENT',
+                            f"Cached content is too small. total_token_count={tokens}, min_total_token_count="
+                            f"{MIN_CACHE_TOKENS}")
+        with self._lock:
+            self.caches_created += 1
+            cache = SimpleNamespace(
+                name=f"cachedContents/fake-{self.caches_created}",
+                model=model,
+                contents=contents,
+                tokens=tokens,
+                expire_time=datetime.now(timezone.utc) + _ttl(config),
+                usage_metadata=SimpleNamespace(total_token_count=tokens),
+            )
+            self._caches[cache.name] = cache
+        return cache
+
+    def _update_cache(self, name, config):
+        with self._lock:
+            cache = self._caches.get(name)
+            if cache is None or cache.expire_time <= datetime.now(timezone.utc):
+                raise api_error(404, 'NOT_FOUND', f"CachedContent not found: {name}")
+            cache.expire_time = datetime.now(timezone.utc) + _ttl(config)
+            return cache
+
+
+def _ttl(config):
+    ttl = getattr(config, 'ttl', None) or "3600s"
+    return timedelta(seconds=float(str(ttl).rstrip('s')))
+
+
+class _Models:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def generate_content(self, model, contents, config=None):
+        call = self._fake._plan(model, contents, config)
+        try:
+            time.sleep(call.wait + call.generating)
+            if call.error is not None:
+                raise call.error
+            return call.response
+        finally:
+            self._fake._finish()
+
+    def generate_content_stream(self, model, contents, config=None):
+        call = self._fake._plan(model, contents, config)
+        try:
+            time.sleep(call.wait)
+            if call.error is not None:
+                raise call.error
+            pieces = self._fake._pieces(call.response)
+            for piece in pieces:
+                time.sleep(call.generating / len(pieces))
+                yield piece
+        finally:
+            self._fake._finish()
+
+
+class _AsyncModels:
+    def __init__(self, fake):
+        self._fake = fake
+
+    async def generate_content(self, model, contents, config=None):
+        call = self._fake._plan(model, contents, config)
+        try:
+            await asyncio.sleep(call.wait + call.generating)
+            if call.error is not None:
+                raise call.error
+            return call.response
+        finally:
+            self._fake._finish()
+
+    async def generate_content_stream(self, model, contents, config=None):
+        call = self._fake._plan(model, contents, config)
+
+        async def stream():
+            try:
+                await asyncio.sleep(call.wait)
+                if call.error is not None:
+                    raise call.error
+                pieces = self._fake._pieces(call.response)
+                for piece in pieces:
+                    await asyncio.sleep(call.generating / len(pieces))
+                    yield piece
+            finally:
+                self._fake._finish()
+
+        return stream()
+
+
+class _Files:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def upload(self, file, config=None):
+        time.sleep(self._fake._lognormal(self._fake.upload_seconds))
+        return self._fake._upload(file)
+
+
+class _Caches:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, model, config):
+        return self._fake._create_cache(model, config)
+
+    def update(self, name, config=None):
+        return self._fake._update_cache(name, config)
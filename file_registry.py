@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import os
+import pathlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+from metrics import call_metrics
+
+logger = logging.getLogger('pdfsummarizer')
+
+# Re-upload slightly before Gemini drops the file so in-flight calls don't race the expiry
+EXPIRY_MARGIN = timedelta(minutes=5)
+# The Files API keeps uploads for 48 hours; used when the handle has no expiration_time
+DEFAULT_LIFETIME = timedelta(hours=48)
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _PendingUpload:
+    def __init__(self):
+        self.done = threading.Event()
+        self.handle = None
+        self.error = None
+
+
+class FileRegistry:
+    """Uploads each distinct PDF to Gemini once and hands the remote file to every caller.
+
+    Entries are keyed by content hash, so renamed copies share an upload and an
+    edited deck gets a fresh one. Concurrent callers for the same deck wait on a
+    single upload instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}   # content hash -> (remote file, expires_at)
+        self._pending = {}   # content hash -> _PendingUpload
+        self._hashes = {}    # resolved path -> ((mtime_ns, size), content hash)
+
+    def content_hash(self, file_path):
+        """Hash of the file contents, recomputed only when the file's mtime or size changes."""
+        path = pathlib.Path(file_path).resolve()
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        digest = hash_file(path)
+        with self._lock:
+            self._hashes[path] = (signature, digest)
+        return digest
+
+    def get(self, client, file_path, force=False):
+        """Return the remote file for file_path, uploading only if there is no live handle."""
+        digest = self.content_hash(file_path)
+        with self._lock:
+            if force:
+                self._entries.pop(digest, None)
+            entry = self._entries.get(digest)
+            if entry and entry[1] - EXPIRY_MARGIN > datetime.now(timezone.utc):
+                return entry[0]
+            pending = self._pending.get(digest)
+            is_uploader = pending is None
+            if is_uploader:
+                pending = _PendingUpload()
+                self._pending[digest] = pending
+
+        if not is_uploader:
+            logger.info(f"Waiting for in-progress upload of {pathlib.Path(file_path).name}")
+            pending.done.wait()
+            if pending.error:
+                raise pending.error
+            return pending.handle
+
+        try:
+            logger.info(f"Uploading {pathlib.Path(file_path).name} to Gemini (sha256 {digest[:12]})")
+            with call_metrics.timed('upload', None):
+                handle = client.files.upload(file=file_path)
+            expires_at = getattr(handle, 'expiration_time', None) or (
+                datetime.now(timezone.utc) + DEFAULT_LIFETIME
+            )
+            with self._lock:
+                self._entries[digest] = (handle, expires_at)
+            pending.handle = handle
+            return handle
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
+            pending.done.set()
+
+    def invalidate(self, file_path):
+        """Forget the remote file so the next get() uploads again."""
+        digest = self.content_hash(file_path)
+        with self._lock:
+            self._entries.pop(digest, None)
+
+
+file_registry = FileRegistry()
@@ -0,0 +1,29 @@
+import os
+import threading
+
+from google import genai
+
+# GEMINI_BACKEND=fake swaps the Gemini API for the local simulator in fake_gemini.py,
+# so the pipeline and the web app can be exercised and benchmarked without quota. It is
+# read on each make_client() call, after the app has loaded .env.
+
+_fake_client = None
+_fake_lock = threading.Lock()
+
+
+def make_client(api_key, **kwargs):
+    """The client every model call goes through: a genai.Client, or the shared fake backend.
+
+    Anything passed as client must offer models.generate_content(_stream), the same under
+    aio.models, files.upload and caches.create/update, as genai.Client does. The fake is
+    one per process, like the real service, so uploads and context caches made by the
+    pipeline are visible to the web app.
+    """
+    global _fake_client
+    if os.getenv("GEMINI_BACKEND", "gemini") != "fake":
+        return genai.Client(api_key=api_key, **kwargs)
+    from fake_gemini import FakeClient
+    with _fake_lock:
+        if _fake_client is None:
+            _fake_client = FakeClient.from_env()
+        return _fake_client
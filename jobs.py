@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger('pdfsummarizer')
+
+# Finished jobs stay around this long so late subscribers can still replay their events
+FINISHED_JOB_TTL = 3600
+
+
+class Job:
+    """One processing run. Events are kept in order so subscribers can join at any point."""
+
+    def __init__(self, deck_id):
+        self.id = uuid.uuid4().hex[:12]
+        self.deck_id = deck_id
+        self.status = 'running'
+        self.started_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self._cond = threading.Condition()
+        self._promoter = None    # (event loop, promote_slide) once the run can schedule slides
+        self._requested = []     # slides asked for before that
+
+    def attach_promoter(self, loop, promote):
+        """Called from the run's event loop once promote(slide_number) can reorder its slides."""
+        with self._cond:
+            self._promoter = (loop, promote)
+            requested, self._requested = self._requested, []
+        for slide_number in requested:
+            promote(slide_number)
+
+    def promote(self, slide_number):
+        """Ask the run to generate this slide and its neighbours next; safe from any thread."""
+        with self._cond:
+            if self.status != 'running':
+                return
+            if self._promoter is None:
+                self._requested.append(slide_number)
+                return
+            loop, promote = self._promoter
+        try:
+            loop.call_soon_threadsafe(promote, slide_number)
+        except RuntimeError:
+            # The run's loop has already closed
+            pass
+
+    def wait_for(self, match, start=0, timeout=10):
+        """Wait until an event from `start` on satisfies match(event, data), up to `timeout` seconds.
+
+        Returns (event, data), or None on timeout or if the job ends first.
+        """
+        deadline = time.monotonic() + timeout
+        idx = start
+        with self._cond:
+            while True:
+                for event, data in self.events[idx:]:
+                    if match(event, data):
+                        return event, data
+                idx = len(self.events)
+                remaining = deadline - time.monotonic()
+                if self.status != 'running' or remaining <= 0:
+                    return None
+                self._cond.wait(timeout=remaining)
+
+    def publish(self, event, data):
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.status = 'failed' if error else 'done'
+            self.finished_at = time.time()
+            self._promoter = None
+            self.events.append(('end', {'status': self.status, 'error': str(error) if error else None}))
+            self._cond.notify_all()
+
+    def stream(self, start=0, heartbeat=15):
+        """Yield (index, event, data) from `start` on, or None every `heartbeat` seconds of silence."""
+        idx = start
+        while True:
+            with self._cond:
+                if idx >= len(self.events) and self.status == 'running':
+                    self._cond.wait(timeout=heartbeat)
+                pending = self.events[idx:]
+                finished = self.status != 'running'
+            if not pending:
+                if finished:
+                    return
+                yield None
+                continue
+            for event, data in pending:
+                yield idx, event, data
+                idx += 1
+
+
+class JobRegistry:
+    """At most one running job per deck; later requests for the same deck join it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active = {}  # deck id -> running job
+
+    def start(self, deck_id, target):
+        """Run target(job) in a background thread unless the deck already has a running job.
+
+        Returns (job, created).
+        """
+        with self._lock:
+            self._prune()
+            job = self._active.get(deck_id)
+            if job is not None:
+                return job, False
+            job = Job(deck_id)
+            self._jobs[job.id] = job
+            self._active[deck_id] = job
+
+        def run():
+            error = None
+            try:
+                target(job)
+            except Exception as e:
+                logger.error(f"Job {job.id} for {deck_id} failed: {e}")
+                error = e
+            finally:
+                with self._lock:
+                    if self._active.get(deck_id) is job:
+                        del self._active[deck_id]
+                job.finish(error)
+
+        threading.Thread(target=run, name=f"job-{job.id}", daemon=True).start()
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self, deck_id):
+        with self._lock:
+            return self._active.get(deck_id)
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
@@ -0,0 +1,277 @@
+import json
+import re
+import threading
+from collections import Counter
+
+# How often each stage of extract_json() succeeded, plus model fallbacks recorded by callers
+repair_stats = Counter()
+_stats_lock = threading.Lock()
+
+JSON_FIX_PROMPT = """The following text was meant to be valid JSON but may be malformed.
+    Please carefully format it as valid JSON, preserving all the information:
+
+    {text}
+
+    Return ONLY the fixed JSON with no additional text or explanation."""
+
+FENCE_RE = re.compile(r"^\s*```[a-zA-Z0-9_-]*\s*\n?(.*?)\n?\s*```\s*$", re.DOTALL)
+BAREWORDS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+
+def record(stage):
+    with _stats_lock:
+        repair_stats[stage] += 1
+
+
+def strip_code_fences(text):
+    match = FENCE_RE.match(text)
+    return match.group(1) if match else text
+
+
+def looks_like_json(text):
+    return strip_code_fences(text).lstrip()[:1] in ('{', '[')
+
+
+def find_json_span(text):
+    """The first top-level {...} or [...] in text, closed off if the text was truncated.
+
+    A truncated tail is cut back to the last complete member before the brackets are
+    closed, so a dangling key, a key without a value or a half-written number is dropped.
+    A string value cut short is kept and closed.
+    """
+    start = next((i for i, ch in enumerate(text) if ch in '{['), None)
+    if start is None:
+        return None
+    # One [closer, expecting] per open container; expecting is 'key', 'colon', 'value' or 'comma'
+    stack = []
+    quote = None
+    escaped = False
+    token = False
+    # Where the text can be cut and closed off, and the closers open at that point
+    safe, safe_closers = start, ''
+
+    def completed(end, is_key):
+        nonlocal safe, safe_closers
+        if is_key:
+            stack[-1][1] = 'colon'
+            return
+        stack[-1][1] = 'comma'
+        safe, safe_closers = end, ''.join(closer for closer, _ in reversed(stack))
+
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == quote:
+                quote = None
+                completed(i + 1, stack[-1][1] == 'key')
+            continue
+        if token:
+            if ch.isalnum() or ch in '_-+.':
+                continue
+            token = False
+            completed(i, stack[-1][1] == 'key')
+        if ch in '"\'':
+            quote = ch
+        elif ch in '{[':
+            stack.append(['}', 'key'] if ch == '{' else [']', 'value'])
+            safe, safe_closers = i + 1, ''.join(closer for closer, _ in reversed(stack))
+        elif ch in '}]':
+            if stack and stack[-1][0] == ch:
+                stack.pop()
+            if not stack:
+                return text[start:i + 1]
+            completed(i + 1, False)
+        elif ch == ':':
+            stack[-1][1] = 'value'
+        elif ch == ',':
+            stack[-1][1] = 'key' if stack[-1][0] == '}' else 'value'
+        elif ch.isalnum() or ch in '_-+.':
+            token = True
+    # Truncated inside a string value: keep what was written of it
+    if quote and stack[-1][1] == 'value':
+        tail = text[start:len(text) - 1 if escaped else len(text)]
+        return tail + quote + ''.join(closer for closer, _ in reversed(stack))
+    return text[start:safe] + safe_closers
+
+
+def repair_json_text(text):
+    """Fix the usual model mistakes outside of strings: single quotes, Python literals,
+    unquoted keys, trailing commas and raw newlines inside strings."""
+    out = []
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch in '"\'':
+            quote = ch
+            i += 1
+            buf = ['"']
+            while i < n and text[i] != quote:
+                c = text[i]
+                if c == '\\' and i + 1 < n:
+                    nxt = text[i + 1]
+                    # \' is not a valid JSON escape
+                    buf.append("'" if nxt == "'" else c + nxt)
+                    i += 2
+                    continue
+                if c == '"':
+                    buf.append('\\"')
+                elif c == '\n':
+                    buf.append('\\n')
+                elif c == '\t':
+                    buf.append('\\t')
+                else:
+                    buf.append(c)
+                i += 1
+            buf.append('"')
+            out.append(''.join(buf))
+            i += 1
+            continue
+        if ch in '}]':
+            # Drop a trailing comma before the closer
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            out.append(ch)
+            i += 1
+            continue
+        if ch.isalpha() or ch == '_':
+            j = i
+            while j < n and (text[j].isalnum() or text[j] in '_-'):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < n and text[k].isspace():
+                k += 1
+            if k < n and text[k] == ':':
+                out.append(json.dumps(word))
+            else:
+                out.append(BAREWORDS.get(word, word))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    return ''.join(out)
+
+
+def extract_json(text):
+    """Parse JSON out of a model response, repairing it locally if needed.
+
+    Raises ValueError when nothing usable can be recovered.
+    """
+    try:
+        value = json.loads(text)
+        record('parsed')
+        return value
+    except (json.JSONDecodeError, TypeError):
+        pass
+    span = find_json_span(strip_code_fences(text or ''))
+    if span is not None:
+        for candidate in (span, repair_json_text(span)):
+            try:
+                value = json.loads(candidate)
+                record('repaired')
+                return value
+            except json.JSONDecodeError:
+                continue
+    record('failed')
+    raise ValueError("No valid JSON object could be recovered from the response")
+
+
+def validate_chunk_schema(data):
+    """Check and normalize the chunk summary structure; raises ValueError if unusable."""
+    if not isinstance(data, dict) or not isinstance(data.get('chunks'), list):
+        raise ValueError("Chunk summary must be an object with a 'chunks' list")
+    chunks = []
+    for chunk in data['chunks']:
+        if not isinstance(chunk, dict):
+            continue
+        slide_numbers = []
+        for sn in chunk.get('slide_numbers') or []:
+            try:
+                slide_numbers.append(int(sn))
+            except (TypeError, ValueError):
+                continue
+        if not slide_numbers:
+            continue
+        slides = chunk.get('slides')
+        chunks.append({
+            **chunk,
+            'topic': str(chunk.get('topic', '')),
+            'pedagogical_goal': str(chunk.get('pedagogical_goal', '')),
+            'slides': slides if isinstance(slides, list) else [],
+            'slide_numbers': slide_numbers,
+            'is_logistics': bool(chunk.get('is_logistics', False)),
+        })
+    if not chunks:
+        raise ValueError("Chunk summary contains no chunks with slide numbers")
+    return {'academic_context': str(data.get('academic_context', '')), 'chunks': chunks}
+
+
+class ChunkStreamParser:
+    """Incrementally scans a streamed chunk-summary response and returns each object in
+    its top-level "chunks" array as soon as that object is complete."""
+
+    def __init__(self):
+        self.buffer = ''
+        self._pos = 0
+        self._stack = []
+        self._quote = None
+        self._escaped = False
+        self._string_start = None
+        self._last_string = None
+        self._chunks_level = None
+        self._object_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == self._quote:
+                    self._quote = None
+                    self._last_string = buf[self._string_start + 1:i]
+                continue
+            if not self._stack and ch not in '{[':
+                continue  # preamble such as "Here's the JSON:" or a code fence
+            if ch in '"\'':
+                self._quote = ch
+                self._string_start = i
+            elif ch in '{[':
+                if ch == '[' and self._chunks_level is None and len(self._stack) == 1 \
+                        and self._last_string == 'chunks':
+                    self._chunks_level = len(self._stack) + 1
+                self._stack.append(ch)
+                if ch == '{' and self._chunks_level is not None \
+                        and len(self._stack) == self._chunks_level + 1:
+                    self._object_start = i
+            elif ch in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if ch == '}' and self._object_start is not None \
+                        and len(self._stack) == self._chunks_level:
+                    completed.append(buf[self._object_start:i + 1])
+                    self._object_start = None
+                elif ch == ']' and self._chunks_level is not None \
+                        and len(self._stack) < self._chunks_level:
+                    self._chunks_level = float('inf')  # array closed; ignore anything after it
+        self._pos = len(buf)
+
+        chunks = []
+        for raw in completed:
+            try:
+                chunks.extend(validate_chunk_schema({'chunks': [extract_json(raw)]})['chunks'])
+            except ValueError:
+                continue
+        return chunks
@@ -0,0 +1,176 @@
+import contextlib
+import contextvars
+import json
+import logging
+import math
+import threading
+import time
+from collections import Counter, deque
+
+from scheduler import current_attempt, status_code
+
+# One JSON record per model call goes to this logger; setup_logging() sends it to the log file only
+CALL_LOGGER_NAME = 'pdfsummarizer.calls'
+call_logger = logging.getLogger(CALL_LOGGER_NAME)
+
+# Upper bounds, in seconds, of the latency histogram buckets (the last bucket is unbounded)
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Percentiles are taken over this many of the most recent calls of each operation
+RECENT_CALLS = 1000
+
+# Deck and slide(s) the current task's calls are for. Tasks inherit the labels of the
+# code that started them, so a deck label set before slides are scheduled reaches every call.
+call_labels = contextvars.ContextVar('call_labels', default={})
+
+
+@contextlib.contextmanager
+def labelled(**labels):
+    """Attach labels (deck=..., slide=...) to the calls made inside the block."""
+    token = call_labels.set({**call_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        call_labels.reset(token)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class _Call:
+    """Handed to the body of CallMetrics.timed(); pass each response through done()."""
+
+    def __init__(self):
+        self.usage = None
+
+    def done(self, response):
+        # Streams report usage on their last chunk, so keep the latest one seen
+        self.usage = getattr(response, 'usage_metadata', None) or self.usage
+        return response
+
+
+class _OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.recent = deque(maxlen=RECENT_CALLS)
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+
+
+class CallMetrics:
+    """Counters and latency histograms of model calls, by operation and by deck.
+
+    Every call is also logged as one JSON record (operation, model, deck, slide, latency,
+    tokens, retries, context cache use, error) on the 'pdfsummarizer.calls' logger.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}   # operation -> _OperationStats
+        self._decks = {}        # deck id -> token and call counters
+        self._error_codes = Counter()
+
+    @contextlib.contextmanager
+    def timed(self, operation, model, context_cache=False, retries=None):
+        """Time the model call made inside the block and record it, failed or not."""
+        call = _Call()
+        started = time.perf_counter()
+        try:
+            yield call
+        except BaseException as e:
+            self.record(operation, model, time.perf_counter() - started, call.usage, e, context_cache, retries)
+            raise
+        self.record(operation, model, time.perf_counter() - started, call.usage, None, context_cache, retries)
+
+    def record(self, operation, model, latency, usage=None, error=None, context_cache=False, retries=None):
+        labels = call_labels.get()
+        if retries is None:
+            retries = current_attempt.get() - 1
+        input_tokens = getattr(usage, 'prompt_token_count', None) or 0
+        output_tokens = getattr(usage, 'candidates_token_count', None) or 0
+        cached_tokens = getattr(usage, 'cached_content_token_count', None) or 0
+        code = None
+        if error is not None:
+            code = status_code(error) or type(error).__name__
+        with self._lock:
+            stats = self._operations.setdefault(operation, _OperationStats())
+            stats.calls += 1
+            stats.retries += retries
+            stats.latency_sum += latency
+            stats.buckets[next((i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound),
+                               len(LATENCY_BUCKETS))] += 1
+            stats.recent.append(latency)
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cached_tokens += cached_tokens
+            if code is not None:
+                stats.errors += 1
+                self._error_codes[str(code)] += 1
+            deck = self._decks.setdefault(labels.get('deck', 'unknown'), Counter())
+            deck['calls'] += 1
+            deck['input_tokens'] += input_tokens
+            deck['output_tokens'] += output_tokens
+            deck['cached_tokens'] += cached_tokens
+        call_logger.info(json.dumps({
+            'operation': operation,
+            'model': model,
+            **labels,
+            'latency_ms': round(latency * 1000, 1),
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cached_tokens': cached_tokens,
+            'context_cache': context_cache,
+            'retries': retries,
+            'error': code,
+        }))
+
+    def snapshot(self):
+        with self._lock:
+            operations = {}
+            for name, stats in sorted(self._operations.items()):
+                recent = list(stats.recent)
+                operations[name] = {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'retries': stats.retries,
+                    'latency_seconds_sum': round(stats.latency_sum, 3),
+                    'latency_p50_ms': round(percentile(recent, 50) * 1000, 1),
+                    'latency_p95_ms': round(percentile(recent, 95) * 1000, 1),
+                    # Cumulative counts of calls at or under each bound, Prometheus style
+                    'latency_buckets': {
+                        **{f"le_{bound}": sum(stats.buckets[:i + 1]) for i, bound in enumerate(LATENCY_BUCKETS)},
+                        'le_inf': stats.calls,
+                    },
+                    'input_tokens': stats.input_tokens,
+                    'output_tokens': stats.output_tokens,
+                    'cached_tokens': stats.cached_tokens,
+                }
+            return {
+                'calls': sum(s.calls for s in self._operations.values()),
+                'errors': sum(s.errors for s in self._operations.values()),
+                'errors_by_code': dict(self._error_codes),
+                'operations': operations,
+                'decks': {deck: dict(counters) for deck, counters in sorted(self._decks.items())},
+            }
+
+    def summary(self):
+        """One line per operation for the end-of-run log."""
+        snapshot = self.snapshot()
+        return [
+            f"{name}: {s['calls']} calls ({s['errors']} failed, {s['retries']} retries), "
+            f"p50 {s['latency_p50_ms']:.0f}ms, p95 {s['latency_p95_ms']:.0f}ms, "
+            f"{s['input_tokens']:,} input / {s['output_tokens']:,} output tokens"
+            for name, s in snapshot['operations'].items()
+        ]
+
+
+call_metrics = CallMetrics()
@@ -0,0 +1,69 @@
+import re
+import threading
+
+# Rough size of one slide's explanation, and the characters-per-token ratio used to estimate prompts
+SLIDE_OUTPUT_TOKENS = 800
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return (len(text or '') + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def pack_slides(slide_numbers, prefix_tokens, budget, per_slide_tokens=SLIDE_OUTPUT_TOKENS, max_slides=10):
+    """Split slide_numbers, in order, into batches whose shared prefix plus per-slide cost fits the budget.
+
+    Every batch holds at least one slide, even if the prefix alone is over budget.
+    """
+    room = max(1, min(max_slides, (budget - prefix_tokens) // per_slide_tokens))
+    return [slide_numbers[i:i + room] for i in range(0, len(slide_numbers), room)]
+
+
+def split_packed_response(data, slide_numbers):
+    """Map each requested slide number to {'title', 'explanation'} from a packed JSON response.
+
+    Slides missing from the response, or with an empty explanation, are left out.
+    """
+    items = data.get('slides') if isinstance(data, dict) else data
+    wanted = set(slide_numbers)
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            sn = int(item.get('slide_number'))
+        except (TypeError, ValueError):
+            continue
+        explanation = str(item.get('explanation') or '').strip()
+        if sn not in wanted or sn in results or not explanation:
+            continue
+        title = str(item.get('title') or '').strip()
+        if not title:
+            title_match = re.search(r'^#\s*(.*?)(?=\n|$)', explanation)
+            title = title_match.group(1) if title_match else f"Slide {sn}"
+        results[sn] = {'title': title, 'explanation': explanation}
+    return results
+
+
+class PackingStats:
+    """Requests and estimated input tokens sent, next to what one call per slide would have sent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.input_tokens = 0
+        self.baseline_requests = 0
+        self.baseline_tokens = 0
+
+    def record(self, input_tokens, baseline_requests, baseline_tokens):
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += input_tokens
+            self.baseline_requests += baseline_requests
+            self.baseline_tokens += baseline_tokens
+
+    def summary(self):
+        with self._lock:
+            saved = 1 - self.input_tokens / self.baseline_tokens if self.baseline_tokens else 0.0
+            return (f"{self.requests} requests (vs {self.baseline_requests} one call per slide), "
+                    f"~{self.input_tokens:,} input tokens (vs ~{self.baseline_tokens:,}, {saved:.0%} saved)")
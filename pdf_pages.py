@@ -0,0 +1,118 @@
+import hashlib
+import json
+import pathlib
+
+import pymupdf
+
+from atomic_files import atomic_path, write_atomic
+
+# Fingerprint renders are tiny; they only need to change when the slide's pixels do
+FINGERPRINT_SCALE = 0.25
+FINGERPRINT_DIR = pathlib.Path("static/data")
+# Pre-rendered page images for the viewer, one directory per deck version. The viewer
+# picks the smallest width that fills its panel at the screen's pixel density.
+PAGE_IMAGE_DIR = pathlib.Path("static/data/pages")
+PAGE_IMAGE_WIDTHS = (640, 1280, 1920)
+PAGE_IMAGE_QUALITY = 80
+
+
+def page_count(pdf_path):
+    with pymupdf.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def extract_page_texts(pdf_path):
+    """Map of 1-based page number (as a string, like slide_texts.json) to extracted text."""
+    with pymupdf.open(pdf_path) as doc:
+        return {str(i + 1): page.get_text() for i, page in enumerate(doc)}
+
+
+def page_fingerprints(pdf_path):
+    """Per-page hashes of the normalized text and of a low-resolution render."""
+    fingerprints = {}
+    matrix = pymupdf.Matrix(FINGERPRINT_SCALE, FINGERPRINT_SCALE)
+    with pymupdf.open(pdf_path) as doc:
+        for i, page in enumerate(doc):
+            text = ' '.join(page.get_text().split())
+            pixmap = page.get_pixmap(matrix=matrix, alpha=False)
+            fingerprints[str(i + 1)] = {
+                'text': hashlib.sha256(text.encode('utf-8')).hexdigest(),
+                'image': hashlib.sha256(pixmap.samples).hexdigest(),
+            }
+    return fingerprints
+
+
+def fingerprints_path_for(deck_id):
+    return FINGERPRINT_DIR / f"{deck_id}.fingerprints.json"
+
+
+def load_fingerprints(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get('pages', {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_fingerprints(path, pdf_hash, fingerprints):
+    write_atomic(path, json.dumps({'pdf_hash': pdf_hash, 'pages': fingerprints}, indent=4))
+
+
+def changed_pages(old_fingerprints, new_fingerprints):
+    """Pages that are new or whose text or rendering differs from the previous revision."""
+    return {
+        int(page) for page, fingerprint in new_fingerprints.items()
+        if old_fingerprints.get(page) != fingerprint
+    }
+
+
+def write_page_range(pdf_path, first_page, last_page, out_path):
+    """Write pages first_page..last_page (1-based, inclusive) to their own PDF."""
+    with atomic_path(out_path) as tmp_path, pymupdf.open(pdf_path) as src, pymupdf.open() as dst:
+        dst.insert_pdf(src, from_page=first_page - 1, to_page=last_page - 1)
+        dst.save(tmp_path, garbage=3, deflate=True)
+
+
+def write_pages(pdf_path, pages, out_path):
+    """Write the given pages (1-based, in the given order) to their own PDF."""
+    with atomic_path(out_path) as tmp_path, pymupdf.open(pdf_path) as doc:
+        doc.select([page - 1 for page in pages])
+        doc.save(tmp_path, garbage=3, deflate=True)
+
+
+def page_images_dir(pdf_hash):
+    return PAGE_IMAGE_DIR / pdf_hash[:16]
+
+
+def page_image_path(pdf_hash, page, width):
+    return page_images_dir(pdf_hash) / f"{page}-{width}.jpg"
+
+
+def load_page_image_manifest(pdf_hash):
+    """What render_page_images() produced for this deck version, or None if it hasn't finished."""
+    try:
+        with open(page_images_dir(pdf_hash) / "manifest.json", 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def render_page_images(pdf_path, pdf_hash, widths=PAGE_IMAGE_WIDTHS, quality=PAGE_IMAGE_QUALITY):
+    """Render every page to a JPEG at each width; images left by an interrupted run are kept.
+
+    The manifest is written last, so its presence means every image exists.
+    """
+    out_dir = page_images_dir(pdf_hash)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with pymupdf.open(pdf_path) as doc:
+        for number, page in enumerate(doc, 1):
+            for width in widths:
+                path = page_image_path(pdf_hash, number, width)
+                if path.exists():
+                    continue
+                zoom = width / page.rect.width
+                pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+                write_atomic(path, pixmap.tobytes("jpg", jpg_quality=quality))
+        manifest = {'pdf_hash': pdf_hash, 'pages': doc.page_count, 'widths': list(widths)}
+    write_atomic(out_dir / "manifest.json", json.dumps(manifest, indent=4))
+    return manifest
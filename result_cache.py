@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+
+from atomic_files import write_atomic
+
+logger = logging.getLogger('pdfsummarizer')
+
+# Bump when the stored format or the meaning of a cached result changes
+CACHE_VERSION = 1
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Disk cache of model results keyed on (PDF hash, model, prompt hash).
+
+    Any change to the deck, the model or the prompt produces a different key, so
+    stale results are never served; they just age out. Entries are evicted least
+    recently used first once max_entries or max_bytes is exceeded. Writes go to a
+    temp file and are renamed into place, so readers never see a partial entry.
+    """
+
+    def __init__(self, cache_dir, max_entries=2000, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.by_kind = {}  # kind -> [hits, misses]
+        self._lock = threading.Lock()
+        self._index = None  # key -> size in bytes, least recently used first
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+
+    def _key(self, kind, pdf_hash, model, prompt):
+        parts = [str(CACHE_VERSION), kind, pdf_hash, model, hash_text(prompt)]
+        return hash_text('\0'.join(parts))
+
+    def get(self, kind, pdf_hash, model, prompt):
+        key = self._key(kind, pdf_hash, model, prompt)
+        path = self.cache_dir / f"{key}.json"
+        with self._lock:
+            self._load_index()
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._index.pop(key, None)
+                self._count(kind, hit=False)
+                return None
+            if entry.get('version') != CACHE_VERSION or entry.get('kind') != kind:
+                self._count(kind, hit=False)
+                return None
+            self._count(kind, hit=True)
+            if key in self._index:
+                self._index.move_to_end(key)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return entry['value']
+
+    def _count(self, kind, hit):
+        counts = self.by_kind.setdefault(kind, [0, 0])
+        if hit:
+            self.hits += 1
+            counts[0] += 1
+        else:
+            self.misses += 1
+            counts[1] += 1
+
+    def put(self, kind, pdf_hash, model, prompt, value):
+        key = self._key(kind, pdf_hash, model, prompt)
+        entry = {
+            'version': CACHE_VERSION,
+            'kind': kind,
+            'pdf_hash': pdf_hash,
+            'model': model,
+            'prompt_hash': hash_text(prompt),
+            'value': value,
+        }
+        data = json.dumps(entry).encode('utf-8')
+        with self._lock:
+            self._load_index()
+            write_atomic(self.cache_dir / f"{key}.json", data, fsync=True)
+            self._index[key] = len(data)
+            self._index.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._index.values())
+        while self._index and (len(self._index) > self.max_entries or total > self.max_bytes):
+            key, size = self._index.popitem(last=False)
+            total -= size
+            try:
+                (self.cache_dir / f"{key}.json").unlink()
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+            logger.debug(f"Evicted cache entry {key[:12]}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._index or {}),
+                'by_kind': {
+                    kind: {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses)}
+                    for kind, (hits, misses) in sorted(self.by_kind.items())
+                },
+            }
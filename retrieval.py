@@ -0,0 +1,116 @@
+import json
+import math
+import pathlib
+import re
+from collections import Counter
+
+from atomic_files import write_atomic
+
+INDEX_VERSION = 1
+INDEX_DIR = pathlib.Path("static/data")
+
+# Caps how much of each slide ends up in a question prompt
+SNIPPET_CHARS = 1500
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can', 'do', 'does', 'for', 'from',
+    'how', 'i', 'if', 'in', 'into', 'is', 'it', 'its', 'of', 'on', 'or', 'slide', 'so', 'that',
+    'the', 'their', 'then', 'there', 'these', 'this', 'to', 'was', 'we', 'what', 'when', 'where',
+    'which', 'who', 'why', 'will', 'with', 'you', 'your',
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def index_path_for(deck_id):
+    return INDEX_DIR / f"{deck_id}.index.json"
+
+
+class RetrievalIndex:
+    """BM25 index over slides, stored as a single JSON file of term counts and prompt snippets."""
+
+    def __init__(self, docs, snippets, pdf_hash=None, k1=1.5, b=0.75):
+        self.docs = docs          # slide number -> {term: count}
+        self.snippets = snippets  # slide number -> text to put in prompts
+        self.pdf_hash = pdf_hash
+        self.k1 = k1
+        self.b = b
+        self.lengths = {sn: sum(tf.values()) for sn, tf in docs.items()}
+        self.avgdl = sum(self.lengths.values()) / len(docs) if docs else 0.0
+        df = Counter()
+        for tf in docs.values():
+            df.update(tf.keys())
+        n = len(docs)
+        self.idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    @classmethod
+    def build(cls, page_texts, slide_texts, structured_data, pdf_hash=None):
+        """Index each page's extracted text together with its generated summary and chunk topic."""
+        chunk_for_slide = {}
+        for chunk in structured_data.get('chunks', []):
+            for sn in chunk.get('slide_numbers', []):
+                chunk_for_slide.setdefault(int(sn), chunk)
+
+        docs, snippets = {}, {}
+        slide_numbers = {int(k) for k in page_texts} | {int(k) for k in slide_texts}
+        for sn in sorted(slide_numbers):
+            page_text = page_texts.get(str(sn), '')
+            slide = slide_texts.get(str(sn)) or {}
+            if not isinstance(slide, dict):
+                slide = {'title': '', 'summary': slide}
+            chunk = chunk_for_slide.get(sn, {})
+            topic = f"{chunk.get('topic', '')} {chunk.get('pedagogical_goal', '')}".strip()
+            docs[sn] = dict(Counter(tokenize(' '.join([
+                slide.get('title', ''), slide.get('summary', ''), page_text, topic
+            ]))))
+            snippet = f"Title: {slide.get('title', '')}\n"
+            if topic:
+                snippet += f"Topic: {topic}\n"
+            snippet += f"Slide text: {' '.join(page_text.split())}\n"
+            snippet += f"Explanation: {slide.get('summary', '')}"
+            snippets[sn] = snippet[:SNIPPET_CHARS]
+        return cls(docs, snippets, pdf_hash)
+
+    def search(self, query, k=5):
+        """Top-k (slide number, score) pairs for the query, best first."""
+        terms = tokenize(query)
+        scores = {}
+        for sn, tf in self.docs.items():
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[sn] / self.avgdl) if self.avgdl else self.k1
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            if score > 0:
+                scores[sn] = score
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+    def save(self, path):
+        data = {
+            'version': INDEX_VERSION,
+            'pdf_hash': self.pdf_hash,
+            'docs': {str(sn): tf for sn, tf in self.docs.items()},
+            'snippets': {str(sn): text for sn, text in self.snippets.items()},
+        }
+        write_atomic(path, json.dumps(data, separators=(',', ':')))
+
+    @classmethod
+    def load(cls, path):
+        """The saved index, or None if it is missing, unreadable or from an older format."""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if data.get('version') != INDEX_VERSION:
+            return None
+        return cls(
+            {int(sn): tf for sn, tf in data['docs'].items()},
+            {int(sn): text for sn, text in data['snippets'].items()},
+            data.get('pdf_hash'),
+        )
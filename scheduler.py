@@ -0,0 +1,276 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+from collections import namedtuple
+
+import httpx
+
+logger = logging.getLogger('pdfsummarizer')
+
+# Starting, floor and ceiling for in-flight requests per model. GEMINI_MAX_CONCURRENCY caps the ceiling.
+MODEL_CONCURRENCY = {
+    "gemini-2.0-flash": {"initial": 8, "minimum": 1, "maximum": 32},
+    "gemini-2.0-flash-lite": {"initial": 8, "minimum": 1, "maximum": 32},
+    "gemini-1.5-pro": {"initial": 2, "minimum": 1, "maximum": 8},
+}
+DEFAULT_CONCURRENCY = {"initial": 4, "minimum": 1, "maximum": 16}
+
+SchedulerResult = namedtuple('SchedulerResult', ['key', 'value', 'error', 'attempts', 'latency'])
+
+# Which attempt the running job is on (1 for the first try), for instrumenting its calls
+current_attempt = contextvars.ContextVar('current_attempt', default=1)
+
+
+def concurrency_for_model(model):
+    limits = dict(MODEL_CONCURRENCY.get(model, DEFAULT_CONCURRENCY))
+    override = os.getenv("GEMINI_MAX_CONCURRENCY")
+    if override:
+        limits["maximum"] = max(limits["minimum"], int(override))
+        limits["initial"] = min(limits["initial"], limits["maximum"])
+    return limits
+
+
+def status_code(error):
+    for attr in ('code', 'status_code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_throttle(error):
+    code = status_code(error)
+    return code is not None and (code == 429 or code >= 500)
+
+
+def is_retryable(error):
+    # The async client raises httpx's own timeout and network errors, which the SDK doesn't wrap
+    return is_throttle(error) or isinstance(
+        error, (TimeoutError, asyncio.TimeoutError, ConnectionError, httpx.TransportError)
+    )
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """Full-jitter exponential backoff before retrying after the given failed attempt."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: +1 slot per window of successes, halved on 429/5xx.
+
+    Decreases are spaced by `cooldown` seconds so one burst of throttled
+    responses only shrinks the window once. One limiter can be shared by several
+    schedulers to give them a single budget; each is woken when a slot frees up.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16, decrease_factor=0.5, cooldown=2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._last_decrease = float('-inf')
+        self._waiters = set()
+
+    def available(self):
+        return self.in_flight < int(self.limit)
+
+    def acquire(self):
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        for event in self._waiters:
+            event.set()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Hold one slot for a request made outside a scheduler."""
+        event = asyncio.Event()
+        self.subscribe(event)
+        try:
+            while not self.available():
+                event.clear()
+                await event.wait()
+            self.acquire()
+        finally:
+            self.unsubscribe(event)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def subscribe(self, event):
+        self._waiters.add(event)
+
+    def unsubscribe(self, event):
+        self._waiters.discard(event)
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self):
+        now = asyncio.get_running_loop().time()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        logger.warning(f"Throttled by Gemini, reducing concurrency to {int(self.limit)}")
+
+
+async def call_with_retries(factory, limiter=None, label="request", max_retries=3, base_delay=1.0, max_delay=30.0):
+    """Run a one-off request with the same retries and limiter feedback as scheduler jobs.
+
+    Each attempt holds a slot of `limiter` when one is given and is recreated by factory().
+    Retryable failures are retried after a jittered backoff, with the slot released while
+    waiting, and 429/5xx responses shrink the limiter's window.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        token = current_attempt.set(attempt)
+        try:
+            async with limiter.slot() if limiter is not None else contextlib.nullcontext():
+                result = await factory()
+        except Exception as error:
+            if limiter is not None and is_throttle(error):
+                limiter.on_throttle()
+            if not is_retryable(error) or attempt > max_retries:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"Retrying {label} in {delay:.1f}s (attempt {attempt} failed: {error})")
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            current_attempt.reset(token)
+        if limiter is not None:
+            limiter.on_success()
+        return result
+
+
+class SlideScheduler:
+    """Keeps up to limiter.limit jobs in flight and yields results as they finish.
+
+    Jobs are coroutine factories so a failed job can be retried; retryable
+    failures go back in the queue after a jittered exponential backoff. Jobs with a lower
+    priority start first, and promote() can move a queued job ahead of the others.
+    """
+
+    def __init__(self, limiter, max_retries=3, base_delay=1.0, max_delay=30.0):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._jobs = {}      # key -> [factory, attempts, priority, seq of its live _ready entry or None]
+        self._ready = []     # heap of (priority, seq, key); entries superseded by a promotion are skipped
+        self._delayed = []   # heap of (not_before, seq, key)
+        self._running = {}   # task -> (key, started_at)
+        self._seq = itertools.count()
+        self._closed = False
+        self._wakeup = asyncio.Event()
+
+    def submit(self, key, factory, priority=0):
+        seq = next(self._seq)
+        self._jobs[key] = [factory, 0, priority, seq]
+        heapq.heappush(self._ready, (priority, seq, key))
+        self._wakeup.set()
+
+    def promote(self, key, priority):
+        """Give a job that hasn't started a more urgent (lower) priority.
+
+        A job waiting out a retry backoff keeps waiting but takes the priority when it
+        requeues. Returns False for running or finished jobs and ones already as urgent.
+        """
+        job = self._jobs.get(key)
+        if job is None or priority >= job[2] or key in (k for k, _ in self._running.values()):
+            return False
+        job[2] = priority
+        if job[3] is not None:
+            job[3] = next(self._seq)
+            heapq.heappush(self._ready, (priority, job[3], key))
+            self._wakeup.set()
+        return True
+
+    def close(self):
+        """No more jobs will be submitted; results() ends once the queue drains."""
+        self._closed = True
+        self._wakeup.set()
+
+    def _backoff(self, attempt):
+        return backoff_delay(attempt, self.base_delay, self.max_delay)
+
+    def _start(self, key, loop):
+        job = self._jobs[key]
+        job[1] += 1
+        job[3] = None
+        self.limiter.acquire()
+        # The task copies the context it is created in, so it sees its own attempt number
+        token = current_attempt.set(job[1])
+        try:
+            task = asyncio.ensure_future(job[0]())
+        finally:
+            current_attempt.reset(token)
+        self._running[task] = (key, loop.time())
+
+    async def results(self):
+        loop = asyncio.get_running_loop()
+        # Slots freed by other schedulers sharing the limiter wake this one too
+        self.limiter.subscribe(self._wakeup)
+        try:
+            while True:
+                now = loop.time()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, seq, key = heapq.heappop(self._delayed)
+                    self._jobs[key][3] = seq
+                    heapq.heappush(self._ready, (self._jobs[key][2], seq, key))
+                while self._ready and self.limiter.available():
+                    _, seq, key = heapq.heappop(self._ready)
+                    if key in self._jobs and self._jobs[key][3] == seq:
+                        self._start(key, loop)
+
+                if not self._running and not self._ready and not self._delayed and self._closed:
+                    return
+
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                wakeup = asyncio.ensure_future(self._wakeup.wait())
+                done, _ = await asyncio.wait(
+                    [*self._running, wakeup], timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not wakeup.done():
+                    wakeup.cancel()
+                self._wakeup.clear()
+
+                for task in done:
+                    if task is wakeup:
+                        continue
+                    key, started_at = self._running.pop(task)
+                    self.limiter.release()
+                    attempts = self._jobs[key][1]
+                    latency = loop.time() - started_at
+                    error = task.exception()
+                    if error is None:
+                        self.limiter.on_success()
+                        del self._jobs[key]
+                        yield SchedulerResult(key, task.result(), None, attempts, latency)
+                        continue
+                    if is_throttle(error):
+                        self.limiter.on_throttle()
+                    if is_retryable(error) and attempts <= self.max_retries:
+                        delay = self._backoff(attempts)
+                        logger.warning(f"Retrying {key} in {delay:.1f}s (attempt {attempts} failed: {error})")
+                        heapq.heappush(self._delayed, (loop.time() + delay, next(self._seq), key))
+                        continue
+                    del self._jobs[key]
+                    yield SchedulerResult(key, None, error, attempts, latency)
+        finally:
+            self.limiter.unsubscribe(self._wakeup)
+            for task in self._running:
+                task.cancel()
+                self.limiter.release()
+            self._running.clear()
@@ -1,14 +1,32 @@
-from flask import Flask, render_template, send_file, request, jsonify
+from flask import Flask, Response, abort, render_template, send_file, request, jsonify, url_for
 import json
+import logging
 import os
-from google import genai
+from google.genai import errors
 from dotenv import load_dotenv
 import pathlib
 import asyncio
 import threading
-from app import main as process_pdf
+import hashlib
+import re
+from collections import namedtuple
+from datetime import datetime, timezone
+from app import (
+    DEFAULT_PDF_PATH, MODEL_NAME, OVERALL_SUMMARY_PROMPT, USE_CONTEXT_CACHE, main as process_pdf, result_cache
+)
+from answer_cache import AnswerCache
+from context_cache import context_cache
+from file_registry import file_registry
+from gemini_client import make_client
+from jobs import JobRegistry
+from metrics import call_metrics, labelled
+from pdf_pages import PAGE_IMAGE_DIR, load_page_image_manifest
+from json_repair import JSON_FIX_PROMPT, extract_json, looks_like_json, record, repair_stats
+from retrieval import RetrievalIndex, index_path_for
+from slide_store import SlideStore, deck_id_for, slide_texts_path_for
 
 app = Flask(__name__)
+logger = logging.getLogger('pdfsummarizer')
 
 # Load API key from .env file
 load_dotenv()
@@ -16,13 +34,35 @@ api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     raise ValueError("API key not found. Make sure .env file is set correctly.")
 
-client = genai.Client(api_key=api_key)
-PDF_PATH = "03-storage1.pdf"
+client = make_client(api_key)
+# Set PDF_PATH in the environment (or .env) to serve another deck
+PDF_PATH = str(DEFAULT_PDF_PATH)
+# Page image URLs include the deck's content hash, so browsers may keep them indefinitely
+PAGE_IMAGE_MAX_AGE = 365 * 24 * 3600
+DECK_ID = deck_id_for(PDF_PATH)
+SLIDE_TEXTS_PATH = slide_texts_path_for(DECK_ID)
+# Where slides were exported before outputs were kept per deck
+LEGACY_SLIDE_TEXTS_PATH = pathlib.Path('static/data/slide_texts.json')
+RETRIEVAL_TOP_K = 5
+# How long /slide_texts/<n> waits by default, and at most, for a slide still being generated
+SLIDE_WAIT_SECONDS = 10
+MAX_SLIDE_WAIT_SECONDS = 30
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Jaccard word overlap at which a differently worded question reuses a cached answer; unset disables
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0")) or None
 
-# Load mock slide data
+slide_store = SlideStore()
+job_registry = JobRegistry()
+answer_cache = AnswerCache(ttl=ANSWER_CACHE_TTL, similarity=ANSWER_CACHE_SIMILARITY)
+
+# Load slide data, preferring the live store over the exported JSON
 def load_slide_data():
+    slides = slide_store.load(DECK_ID)
+    if slides:
+        return slides
+    path = SLIDE_TEXTS_PATH if SLIDE_TEXTS_PATH.exists() else LEGACY_SLIDE_TEXTS_PATH
     try:
-        with open('static/data/slide_texts.json', 'r') as f:
+        with open(path, 'r') as f:
             content = f.read().strip()
             if not content:
                 # If the file is empty, return a default dictionary
@@ -46,9 +86,82 @@ def load_slide_data():
             "3": "Slide 3: Default Title",
         }
 
+def slide_content(slide_data):
+    if isinstance(slide_data, dict):
+        return f"{slide_data.get('title', '')} - {slide_data.get('summary', '')}"
+    return slide_data
+
+SlideSnapshot = namedtuple(
+    'SlideSnapshot', ['slides', 'order', 'content', 'contexts', 'body', 'etag', 'last_modified']
+)
+
+class SlideIndex:
+    """Parsed, read-only view of the deck's slides, rebuilt only when the data on disk changes.
+
+    Change detection stats the store (and its WAL) and the exported JSON; everything a
+    request needs (sorted order, neighbour context strings, the /slide_texts body and its
+    ETag) is computed once per change.
+    """
+
+    def __init__(self, paths, context_radius=2):
+        self.paths = [pathlib.Path(p) for p in paths]
+        self.context_radius = context_radius
+        self._lock = threading.Lock()
+        # (signature, snapshot), swapped in one assignment so readers never see a mismatched pair
+        self._current = (None, None)
+
+    def _current_signature(self):
+        signature = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _build(self, slides, signature):
+        order = sorted(int(k) for k in slides.keys())
+        content = {sn: slide_content(slides[str(sn)]) for sn in order}
+        contexts = {}
+        for idx, sn in enumerate(order):
+            window = order[max(0, idx - self.context_radius):idx + self.context_radius + 1]
+            contexts[sn] = ", ".join(f"Slide {num}: {content[num]}" for num in window)
+        body = json.dumps(slides).encode('utf-8')
+        mtimes = [entry[0] for entry in signature if entry]
+        last_modified = datetime.fromtimestamp(max(mtimes) / 1e9, timezone.utc) if mtimes else None
+        return SlideSnapshot(
+            slides=slides,
+            order=order,
+            content=content,
+            contexts=contexts,
+            body=body,
+            etag=hashlib.sha1(body).hexdigest(),
+            last_modified=last_modified,
+        )
+
+    def snapshot(self):
+        signature = self._current_signature()
+        current_signature, snapshot = self._current
+        if snapshot is not None and signature == current_signature:
+            return snapshot
+        with self._lock:
+            current_signature, snapshot = self._current
+            if snapshot is None or signature != current_signature:
+                snapshot = self._build(load_slide_data(), signature)
+                self._current = (signature, snapshot)
+            return snapshot
+
+slide_index = SlideIndex([
+    slide_store.db_path,
+    slide_store.db_path.with_name(slide_store.db_path.name + '-wal'),
+    SLIDE_TEXTS_PATH,
+    LEGACY_SLIDE_TEXTS_PATH,
+])
+
 # Get overall context from all slides
 def get_overall_context():
-    slides = load_slide_data()
+    slides = slide_index.snapshot().slides
     context = "This is a lecture about Database Systems, specifically focusing on Database Storage (Files & Pages). "
     context += "The lecture covers: "
     topics = []
@@ -61,90 +174,152 @@ def get_overall_context():
     context += "... and more topics related to database storage systems."
     return context
 
-def get_slide_context(current_slide, slides):
-    """Get context from surrounding slides."""
-    slide_numbers = sorted([int(k) for k in slides.keys()])
-    current_idx = slide_numbers.index(current_slide)
-    
-    # Get 2 slides before and after for context
-    start_idx = max(0, current_idx - 2)
-    end_idx = min(len(slide_numbers), current_idx + 3)
-    
-    context_slides = {}
-    for idx in range(start_idx, end_idx):
-        slide_num = slide_numbers[idx]
-        slide_data = slides[str(slide_num)]
-        if isinstance(slide_data, dict):
-            context_slides[slide_num] = f"{slide_data.get('title', '')} - {slide_data.get('summary', '')}"
-        else:
-            context_slides[slide_num] = slide_data
-    return context_slides
-
 def fix_json_response(text):
-    """Attempt to fix malformed JSON in Gemini's response."""
-    retry_prompt = f"""The following text was meant to be valid JSON but may be malformed. 
-    Please carefully format it as valid JSON, preserving all the information:
-
-    {text}
-
-    Return ONLY the fixed JSON with no additional text or explanation."""
+    """Attempt to fix malformed JSON in Gemini's response.
 
+    Markdown that merely contains braces is returned unchanged. JSON is repaired locally
+    and the model is only asked to fix it when that fails.
+    """
     try:
         # First try parsing as-is
         json.loads(text)
         return text
     except json.JSONDecodeError:
+        if not looks_like_json(text):
+            return text
         try:
-            # Try getting Gemini to fix it
-            response = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=retry_prompt
-            )
+            return json.dumps(extract_json(text), indent=2)
+        except ValueError:
+            pass
+        try:
+            # Last resort: get Gemini to fix it
+            record('model_calls')
+            with call_metrics.timed('json_fix', MODEL_NAME, retries=0) as call:
+                response = call.done(client.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=JSON_FIX_PROMPT.format(text=text)
+                ))
             fixed_text = response.text.strip()
             # Verify the fixed version is valid JSON
-            json.loads(fixed_text)
-            return fixed_text
+            return json.dumps(extract_json(fixed_text), indent=2)
         except Exception as e:
-            print(f"Error fixing JSON: {str(e)}")
+            logger.error(f"Error fixing JSON: {str(e)}")
             raise
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', pdf_url=url_for('serve_pdf', filename=pathlib.Path(PDF_PATH).name))
 
 @app.route('/pdf/<path:filename>')
 def serve_pdf(filename):
-    return send_file('03-storage1.pdf', mimetype='application/pdf')
+    # Only the deck itself; shard and page extracts written next to it stay private
+    path = pathlib.Path(PDF_PATH)
+    if filename != path.name or not path.is_file():
+        abort(404)
+    # Byte ranges let pdf.js fetch just the pages it shows; the content hash is a strong ETag,
+    # so clients revalidate each visit and get a 304 until the deck changes
+    return send_file(path.resolve(), mimetype='application/pdf', etag=file_registry.content_hash(path), max_age=0)
+
+@app.route('/page_images')
+def get_page_images():
+    """Where the current deck's pre-rendered page images are, if the pipeline has rendered them."""
+    pdf_hash = file_registry.content_hash(PDF_PATH)
+    manifest = load_page_image_manifest(pdf_hash)
+    if manifest is None:
+        return jsonify({'ready': False})
+    return jsonify({
+        'ready': True,
+        'pages': manifest['pages'],
+        'widths': manifest['widths'],
+        'url': f"/page_images/{pdf_hash[:16]}/{{page}}-{{width}}.jpg",
+    })
+
+@app.route('/page_images/<key>/<int:page>-<int:width>.jpg')
+def serve_page_image(key, page, width):
+    path = PAGE_IMAGE_DIR / key / f"{page}-{width}.jpg"
+    if not re.fullmatch(r'[0-9a-f]{16}', key) or not path.is_file():
+        abort(404)
+    response = send_file(path.resolve(), mimetype='image/jpeg', max_age=PAGE_IMAGE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/slide_texts')
 def get_slide_texts():
-    return load_slide_data()
+    snapshot = slide_index.snapshot()
+    response = app.response_class(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.last_modified = snapshot.last_modified
+    # Clients may keep the body but must revalidate; unchanged data costs a 304
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
-@app.route('/ask_gemini', methods=['POST'])
-def ask_gemini():
+def slide_response(slide_number, slide, status):
+    body = json.dumps({'slide_number': slide_number, **slide, 'status': status}).encode('utf-8')
+    response = app.response_class(body, status=202 if status == 'pending' else 200, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body).hexdigest())
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/slide_texts/<int:slide_number>')
+def get_slide_text(slide_number):
+    """One slide's title and summary; a slide still being generated is moved to the front.
+
+    While the deck is processing, a slide without a summary is scheduled ahead of the rest
+    (with its neighbours) and the request waits up to `wait` seconds for it. Status is
+    ready, pending (202: ask again), failed, or missing (not generated and no job running).
+    """
+    # Events from here on are looked at below, so a slide finishing in between isn't missed
+    job = job_registry.active(DECK_ID)
+    start = len(job.events) if job is not None else 0
+    slide = slide_index.snapshot().slides.get(str(slide_number))
+    if isinstance(slide, str):
+        slide = {'title': slide, 'summary': ''}
+    if slide is not None and slide.get('summary'):
+        return slide_response(slide_number, slide, 'ready')
+    if job is None:
+        if slide is None:
+            return jsonify({'success': False, 'error': f'Unknown slide {slide_number}'}), 404
+        return slide_response(slide_number, slide, 'missing')
+
+    job.promote(slide_number)
+    wait = min(max(request.args.get('wait', SLIDE_WAIT_SECONDS, type=float), 0), MAX_SLIDE_WAIT_SECONDS)
+    found = job.wait_for(
+        lambda event, data: event in ('slide', 'slide_failed') and data.get('slide_number') == slide_number,
+        start, wait
+    )
+    slide = slide or {'title': '', 'summary': ''}
+    if found is None:
+        return slide_response(slide_number, slide, 'pending')
+    event, data = found
+    if event == 'slide_failed':
+        return slide_response(slide_number, slide, 'failed')
+    return slide_response(slide_number, {'title': data['title'], 'summary': data['summary']}, 'ready')
+
+_retrieval_lock = threading.Lock()
+_retrieval_cache = {'signature': None, 'index': None}
+
+def get_retrieval_index():
+    """The deck's retrieval index, reloaded only when the file on disk changes."""
+    path = index_path_for(DECK_ID)
     try:
-        data = request.json
-        question = data.get('question')
-        current_slide = int(data.get('currentSlide'))
-        
-        # Get slides data
-        slides = load_slide_data()
-        
-        # Get current slide content
-        current_slide_data = slides[str(current_slide)]
-        if isinstance(current_slide_data, dict):
-            current_slide_content = f"{current_slide_data.get('title', '')} - {current_slide_data.get('summary', '')}"
-        else:
-            current_slide_content = current_slide_data
-        
-        # Get surrounding slides for context
-        context_slides = get_slide_context(current_slide, slides)
-        
-        # Upload the PDF file to Gemini
-        sample_file = client.files.upload(file=PDF_PATH)
-        
-        # Construct prompt with slide content and question
-        prompt = f"""This is a question about slide {current_slide} of the PDF document.
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+    with _retrieval_lock:
+        if _retrieval_cache['signature'] != signature:
+            _retrieval_cache['index'] = RetrievalIndex.load(path)
+            _retrieval_cache['signature'] = signature
+        return _retrieval_cache['index']
+
+def build_question_prompt(question, current_slide):
+    # Current slide and its neighbours, precomputed by the slide index
+    slides = slide_index.snapshot()
+    current_slide_content = slides.content[current_slide]
+    surrounding_content = slides.contexts[current_slide]
+
+    # Construct prompt with slide content and question
+    return f"""This is a question about slide {current_slide} of the PDF document.
 
 Question: {question}
 
@@ -152,56 +327,253 @@ Current Slide Content:
 {current_slide_content}
 
 Surrounding Slides Content:
-{", ".join([f"Slide {num}: {content}" for num, content in context_slides.items()])}
+{surrounding_content}
 
 Please focus on answering the question based on both the PDF content and the slide summaries provided.
 Format your response as valid markdown text."""
 
-        # Call Gemini with both PDF and prompt
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[sample_file, prompt]
+def build_retrieval_prompt(question, current_slide, index):
+    current_title = slide_index.snapshot().slides.get(str(current_slide), {})
+    if isinstance(current_title, dict):
+        current_title = current_title.get('title', '')
+    hits = [sn for sn, _ in index.search(f"{question} {current_title}", k=RETRIEVAL_TOP_K)]
+    relevant = [current_slide] + [sn for sn in hits if sn != current_slide]
+    relevant_content = "\n\n".join(f"Slide {sn}:\n{index.snippets[sn]}" for sn in relevant)
+
+    return f"""This is a question about slide {current_slide} of a lecture slide deck.
+
+Question: {question}
+
+The slides most relevant to the question (the current slide first):
+
+{relevant_content}
+
+Please focus on answering the question based on the slide content provided, and cite slide numbers when you refer to other slides.
+Format your response as valid markdown text."""
+
+QuestionRequest = namedtuple('QuestionRequest', ['contents', 'model', 'config', 'context', 'uses_file'])
+
+def question_contents(question, current_slide, force_upload=False):
+    """Model request for a question, and whether it relies on the uploaded PDF.
+
+    With a retrieval index only the top-ranked slides are sent; without one the whole
+    PDF goes along with the current slide's neighbours, through the deck's context
+    cache once the pipeline has produced an overall summary to cache with it.
+    """
+    index = get_retrieval_index()
+    if index is not None and current_slide in index.snippets:
+        return QuestionRequest([build_retrieval_prompt(question, current_slide, index)], MODEL_NAME, None, None, False)
+    prompt = build_question_prompt(question, current_slide)
+    pdf_hash = file_registry.content_hash(PDF_PATH)
+    summary = result_cache.get("overall_summary", pdf_hash, MODEL_NAME, OVERALL_SUMMARY_PROMPT)
+    if USE_CONTEXT_CACHE and summary:
+        handle = context_cache.get(
+            client, pdf_hash, MODEL_NAME, summary,
+            lambda: file_registry.get(client, PDF_PATH, force=force_upload)
         )
+        if handle is not None:
+            return QuestionRequest([prompt], handle.model, context_cache.config(handle), handle, True)
+    # Reuse the deck already uploaded to Gemini, uploading only on first use or after expiry
+    sample_file = file_registry.get(client, PDF_PATH, force=force_upload)
+    return QuestionRequest([sample_file, prompt], MODEL_NAME, None, None, True)
 
-        # Get the response text
-        response_text = response.text
+def refresh_question_contents(question, current_slide, stale):
+    """Rebuild a request whose remote file or context cache Gemini no longer has."""
+    if stale.context is not None:
+        context_cache.invalidate(stale.context)
+    return question_contents(question, current_slide, force_upload=True)
 
-        # If the response looks like it might be JSON, try to fix it
-        if '{' in response_text and '}' in response_text:
-            try:
-                response_text = fix_json_response(response_text)
-            except Exception as e:
-                print(f"Failed to fix JSON response: {str(e)}")
-                # Continue with original response if fixing fails
+def format_sse(event, data, event_id=None):
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def ask_model(question_request, retries=0):
+    with call_metrics.timed('question', question_request.model, question_request.context is not None,
+                            retries=retries) as call:
+        return call.done(client.models.generate_content(
+            model=question_request.model,
+            contents=question_request.contents,
+            config=question_request.config
+        ))
+
+def generate_answer(question, current_slide):
+    question_request = question_contents(question, current_slide)
+
+    # Call Gemini with the prompt (and the PDF when there is no retrieval index)
+    try:
+        response = ask_model(question_request)
+    except errors.ClientError as e:
+        # The remote file or context cache was deleted or expired early; rebuild it and retry once
+        if not question_request.uses_file or e.code not in (403, 404):
+            raise
+        question_request = refresh_question_contents(question, current_slide, question_request)
+        response = ask_model(question_request, retries=1)
+    if question_request.context is not None:
+        # Without the cache the question would have uploaded the PDF
+        context_cache.record_usage(question_request.context, response, question_request.context.file_tokens)
+
+    # Get the response text
+    response_text = response.text
+
+    # If the response looks like it might be JSON, try to fix it
+    if '{' in response_text and '}' in response_text:
+        try:
+            response_text = fix_json_response(response_text)
+        except Exception as e:
+            logger.warning(f"Failed to fix JSON response: {str(e)}")
+            # Continue with original response if fixing fails
+    return response_text
+
+def answer_cache_key(question, current_slide):
+    return AnswerCache.key(file_registry.content_hash(PDF_PATH), current_slide, question)
+
+@app.route('/ask_gemini', methods=['POST'])
+def ask_gemini():
+    try:
+        data = request.json
+        question = data.get('question')
+        current_slide = int(data.get('currentSlide'))
+
+        # Repeated questions are served from the cache; identical concurrent ones share one call
+        with labelled(deck=DECK_ID, slide=current_slide):
+            response_text, source = answer_cache.get_or_compute(
+                answer_cache_key(question, current_slide),
+                lambda: generate_answer(question, current_slide)
+            )
         
         return jsonify({
             'success': True,
-            'response': response_text
+            'response': response_text,
+            'cached': source != 'miss'
         })
         
     except Exception as e:
-        print(f"Error in ask_gemini: {str(e)}")  # Add logging
+        logger.error(f"Error in ask_gemini: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/ask_gemini_stream', methods=['POST'])
+def ask_gemini_stream():
+    """Same as /ask_gemini, but forwards the answer as server-sent events while it is generated."""
+    try:
+        data = request.json
+        question = data.get('question')
+        current_slide = int(data.get('currentSlide'))
+        cache_key = answer_cache_key(question, current_slide)
+        source, value = answer_cache.claim(cache_key)
+        if source == 'leader':
+            try:
+                question_request = question_contents(question, current_slide)
+            except Exception as e:
+                answer_cache.reject(cache_key, e)
+                raise
+    except Exception as e:
+        logger.error(f"Error in ask_gemini_stream: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+    def cached_stream():
+        try:
+            answer = value if source != 'shared' else AnswerCache.wait(value)
+            yield format_sse('chunk', {'text': answer})
+            yield format_sse('done', {'cached': True})
+        except Exception as e:
+            yield format_sse('error', {'error': str(e)})
+
+    def stream():
+        nonlocal question_request
+        parts = []
+        try:
+            for attempt in range(2):
+                try:
+                    last = None
+                    with labelled(deck=DECK_ID, slide=current_slide), call_metrics.timed(
+                        'question_stream', question_request.model, question_request.context is not None,
+                        retries=attempt
+                    ) as call:
+                        for chunk in client.models.generate_content_stream(
+                            model=question_request.model,
+                            contents=question_request.contents,
+                            config=question_request.config
+                        ):
+                            last = call.done(chunk)
+                            if chunk.text:
+                                parts.append(chunk.text)
+                                yield format_sse('chunk', {'text': chunk.text})
+                    if question_request.context is not None and last is not None:
+                        # Usage totals arrive with the final chunk
+                        context_cache.record_usage(question_request.context, last,
+                                                   question_request.context.file_tokens)
+                    answer_cache.resolve(cache_key, ''.join(parts))
+                    yield format_sse('done', {'cached': False})
+                    return
+                except errors.ClientError as e:
+                    # Stale remote file: re-upload and retry once, but only if nothing was sent yet
+                    if attempt == 0 and question_request.uses_file and not parts and e.code in (403, 404):
+                        question_request = refresh_question_contents(question, current_slide, question_request)
+                        continue
+                    raise
+        except Exception as e:
+            logger.error(f"Error in ask_gemini_stream: {str(e)}")
+            answer_cache.reject(cache_key, e, value)
+            yield format_sse('error', {'error': str(e)})
+        finally:
+            # Client went away mid-stream: release anyone waiting on this answer
+            answer_cache.reject(cache_key, RuntimeError("Answer stream was interrupted"), value)
+
+    if source != 'leader':
+        return Response(cached_stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # A generator closed before its first step never runs its finally; the response is always closed
+    response.call_on_close(
+        lambda: answer_cache.reject(cache_key, RuntimeError("Answer stream was not sent"), value)
+    )
+    return response
+
+@app.route('/answer_cache/stats')
+def get_answer_cache_stats():
+    return jsonify(answer_cache.stats())
+
+@app.route('/context_cache/stats')
+def get_context_cache_stats():
+    return jsonify(context_cache.stats())
+
+@app.route('/metrics')
+def get_metrics():
+    """Model call counters and latency histograms, with the hit rates of every cache."""
+    return jsonify({
+        **call_metrics.snapshot(),
+        'caches': {
+            'results': result_cache.stats(),
+            'answers': answer_cache.stats(),
+            'context': context_cache.stats(),
+        },
+    })
+
+@app.route('/json_repair/stats')
+def get_json_repair_stats():
+    return jsonify(dict(repair_stats))
+
 @app.route('/process_pdf', methods=['POST'])
 def trigger_processing():
     try:
-        def run_async():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(process_pdf())
-            loop.close()
-
-        # Run the processing in a background thread
-        thread = threading.Thread(target=run_async)
-        thread.start()
+        def run(job):
+            asyncio.run(process_pdf(PDF_PATH, on_event=job.publish, attach_promoter=job.attach_promoter))
+
+        # One pipeline per deck; a second click joins the job already running
+        job, created = job_registry.start(DECK_ID, run)
         
         return jsonify({
             'success': True,
-            'message': 'PDF processing started'
+            'job_id': job.id,
+            'joined': not created,
+            'message': 'PDF processing started' if created else 'PDF processing already in progress'
         })
     except Exception as e:
         return jsonify({
@@ -209,5 +581,26 @@ def trigger_processing():
             'error': str(e)
         }), 500
 
+@app.route('/process_pdf/<job_id>/events')
+def process_events(job_id):
+    job = job_registry.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+
+    # EventSource sends Last-Event-ID when it reconnects; resume after it
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    start = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+
+    def stream():
+        for item in job.stream(start):
+            if item is None:
+                yield ": keepalive\n\n"
+                continue
+            idx, event, data = item
+            yield format_sse(event, data, idx)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,120 @@
+from collections import namedtuple
+
+# Pages a shard owns (core) and the pages it is shown (start..end), 1-based and inclusive.
+# Cores partition the deck; each shard also sees `overlap` pages of its neighbours so
+# chunks that run across a boundary can be recognised and joined back together.
+Shard = namedtuple('Shard', ['index', 'core_start', 'core_end', 'start', 'end'])
+
+
+def shard_ranges(page_count, shard_size, overlap=0):
+    shards = []
+    for index, core_start in enumerate(range(1, page_count + 1, shard_size)):
+        core_end = min(core_start + shard_size - 1, page_count)
+        shards.append(Shard(
+            index, core_start, core_end,
+            max(1, core_start - overlap), min(page_count, core_end + overlap)
+        ))
+    return shards
+
+
+class ShardChunk:
+    """One chunk from one shard, mapped to deck slide numbers.
+
+    `seen` is every slide the chunk listed; `owned` is the subset in the shard's core
+    that no earlier chunk of the same shard already claimed.
+    """
+
+    def __init__(self, shard, position, chunk, seen, owned, texts):
+        self.shard = shard
+        self.position = position
+        self.chunk = chunk
+        self.seen = seen
+        self.owned = owned
+        self.texts = texts  # slide number -> that slide's entry in chunk['slides']
+
+
+def localize_chunks(shard, chunks):
+    """Map chunks whose slide numbers count from 1 within the shard to deck slide numbers."""
+    offset = shard.start - 1
+    claimed = set()
+    result = []
+    for position, chunk in enumerate(chunks):
+        numbers = [sn + offset for sn in chunk['slide_numbers'] if shard.start <= sn + offset <= shard.end]
+        slides = chunk.get('slides') or []
+        texts = dict(zip(numbers, slides)) if len(slides) == len(chunk['slide_numbers']) else {}
+        owned = []
+        for sn in numbers:
+            if shard.core_start <= sn <= shard.core_end and sn not in claimed:
+                claimed.add(sn)
+                owned.append(sn)
+        result.append(ShardChunk(shard, position, chunk, set(numbers), owned, texts))
+    return result
+
+
+def shared_pages(shards):
+    """Pages shown to more than one shard; only chunks touching these can need merging."""
+    counts = {}
+    for shard in shards:
+        for page in range(shard.start, shard.end + 1):
+            counts[page] = counts.get(page, 0) + 1
+    return {page for page, count in counts.items() if count > 1}
+
+
+def is_final(shard_chunk, overlap_pages):
+    """True if no other shard's chunk can be merged into this one."""
+    return bool(shard_chunk.owned) and not (shard_chunk.seen & overlap_pages)
+
+
+def build_chunk(members):
+    """Combine shard chunks that describe the same run of slides into one chunk."""
+    members = sorted(members, key=lambda m: (m.shard.index, m.position))
+    lead = max(members, key=lambda m: len(m.owned))
+    slide_numbers = sorted(sn for m in members for sn in m.owned)
+    texts = {}
+    for m in members:
+        for sn in m.owned:
+            if sn in m.texts:
+                texts[sn] = m.texts[sn]
+    return {
+        **lead.chunk,
+        'slides': [texts[sn] for sn in slide_numbers if sn in texts],
+        'slide_numbers': slide_numbers,
+        'is_logistics': all(m.chunk.get('is_logistics', False) for m in members),
+    }
+
+
+def merge_shard_chunks(shard_results):
+    """Merge per-shard chunk lists (from localize_chunks) into one list of deck chunks.
+
+    Every slide ends up in exactly one chunk: the first chunk of the shard whose core
+    contains it, or failing that the first neighbouring chunk that listed it. Chunks
+    from neighbouring shards that listed a common overlap page are joined, so a topic
+    split by a shard boundary comes back as a single chunk.
+    """
+    everything = [m for result in shard_results for m in result]
+    # An overlap page its own shard left out can still go to a neighbour that listed it
+    owned = {sn for m in everything for sn in m.owned}
+    for m in everything:
+        for sn in sorted(m.seen - owned):
+            m.owned.append(sn)
+            owned.add(sn)
+    entries = [m for m in everything if m.owned]
+    parent = list(range(len(entries)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, a in enumerate(entries):
+        for j in range(i + 1, len(entries)):
+            b = entries[j]
+            if abs(a.shard.index - b.shard.index) == 1 and a.seen & b.seen:
+                parent[find(j)] = find(i)
+
+    groups = {}
+    for i, entry in enumerate(entries):
+        groups.setdefault(find(i), []).append(entry)
+    chunks = [build_chunk(members) for members in groups.values()]
+    return sorted(chunks, key=lambda chunk: chunk['slide_numbers'][0])
@@ -0,0 +1,94 @@
+import json
+import pathlib
+import sqlite3
+import threading
+
+from atomic_files import write_atomic
+
+DEFAULT_DB_PATH = pathlib.Path("static/data/slides.db")
+EXPORT_DIR = pathlib.Path("static/data")
+
+
+def deck_id_for(pdf_path):
+    return pathlib.Path(pdf_path).stem
+
+
+def slide_texts_path_for(deck_id):
+    return EXPORT_DIR / f"{deck_id}.slides.json"
+
+
+class SlideStore:
+    """One row per (deck, slide) in SQLite running in WAL mode.
+
+    Writers upsert single rows as slides finish. Readers never block on the writer
+    and each read sees a consistent snapshot of the deck.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = pathlib.Path(db_path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS slides (
+                    deck_id TEXT NOT NULL,
+                    slide_number INTEGER NOT NULL,
+                    title TEXT NOT NULL DEFAULT '',
+                    summary TEXT NOT NULL DEFAULT '',
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (deck_id, slide_number)
+                )
+            """)
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def ensure_slides(self, deck_id, slide_numbers):
+        """Insert empty placeholder rows for slides that have none yet."""
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO slides (deck_id, slide_number) VALUES (?, ?)",
+                [(deck_id, int(sn)) for sn in slide_numbers]
+            )
+
+    def upsert_slide(self, deck_id, slide_number, title, summary):
+        conn = self._connection()
+        with conn:
+            conn.execute("""
+                INSERT INTO slides (deck_id, slide_number, title, summary) VALUES (?, ?, ?, ?)
+                ON CONFLICT (deck_id, slide_number) DO UPDATE SET
+                    title = excluded.title,
+                    summary = excluded.summary,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (deck_id, int(slide_number), title, summary))
+
+    def delete_slides_except(self, deck_id, slide_numbers):
+        keep = {int(sn) for sn in slide_numbers}
+        conn = self._connection()
+        with conn:
+            existing = conn.execute(
+                "SELECT slide_number FROM slides WHERE deck_id = ?", (deck_id,)
+            ).fetchall()
+            conn.executemany(
+                "DELETE FROM slides WHERE deck_id = ? AND slide_number = ?",
+                [(deck_id, sn) for (sn,) in existing if sn not in keep]
+            )
+
+    def load(self, deck_id):
+        """The deck in slide_texts.json format: {"1": {"title": ..., "summary": ...}, ...}."""
+        rows = self._connection().execute(
+            "SELECT slide_number, title, summary FROM slides WHERE deck_id = ? ORDER BY slide_number",
+            (deck_id,)
+        ).fetchall()
+        return {str(sn): {"title": title, "summary": summary} for sn, title, summary in rows}
+
+    def export_json(self, deck_id, json_path):
+        """Atomically write the deck to json_path in the format the frontend expects."""
+        write_atomic(json_path, json.dumps(self.load(deck_id), indent=4))
@@ -1,10 +1,18 @@
 document.addEventListener('DOMContentLoaded', function() {
     let pdfDoc = null;
     let pageNum = 1;
+    let pageCount = 0;
     let pageRendering = false;
     let pageNumPending = null;
+    // Manifest of pre-rendered page images, when the server has them; otherwise pdf.js renders the PDF
+    let pageImages = null;
+    const prefetched = new Set();
+    // Slides whose /slide_texts/<n> request is in flight
+    const slideRequests = new Set();
     const canvas = document.getElementById('pdfCanvas');
     const ctx = canvas.getContext('2d');
+    const pageImage = document.getElementById('pageImage');
+    const pdfViewer = document.getElementById('pdfViewer');
     let slideTexts = {};
 
     // Load marked.js for markdown support
@@ -56,6 +64,73 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Stream the answer over server-sent events, calling onText with the text so far
+    async function askGeminiStream(question, onText) {
+        const response = await fetch('/ask_gemini_stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                question: question,
+                currentSlide: pageNum
+            })
+        });
+
+        if (!response.ok || !response.body) {
+            const data = await response.json().catch(() => ({}));
+            throw new Error(data.error || 'Failed to get response from Gemini');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                for (const line of frame.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                if (!data) continue;
+                const payload = JSON.parse(data);
+
+                if (event === 'chunk') {
+                    answer += payload.text;
+                    onText(answer);
+                } else if (event === 'error') {
+                    throw new Error(payload.error);
+                }
+            }
+        }
+        return answer;
+    }
+
+    // Re-render the markdown at most once per animation frame while text streams in
+    function createMarkdownRenderer(element) {
+        let pending = null;
+        return function(text) {
+            if (pending === null) {
+                requestAnimationFrame(() => {
+                    element.innerHTML = marked.parse(pending);
+                    pending = null;
+                });
+            }
+            pending = text;
+        };
+    }
+
     // Submit button click handler
     submitBtn.addEventListener('click', async function() {
         console.log('Submit button clicked');
@@ -71,12 +146,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
         try {
             console.log('Sending request to Gemini...');
-            const response = await askGemini(question);
-            console.log('Got response:', response);
-            if (response.success) {
+            const render = createMarkdownRenderer(responseText);
+            const answer = await askGeminiStream(question, render);
+            if (!answer) {
+                // Nothing was streamed; fall back to the single-response endpoint
+                const response = await askGemini(question);
                 responseText.innerHTML = marked.parse(response.response);
-            } else {
-                responseText.innerHTML = marked.parse(`**Error:** ${response.error}`);
             }
         } catch (error) {
             console.error('Error in submit handler:', error);
@@ -102,23 +177,85 @@ document.addEventListener('DOMContentLoaded', function() {
             updateSlideText(pageNum);
         });
 
-    // Load the PDF
-    pdfjsLib.getDocument('/pdf/03-storage1.pdf').promise.then(function(pdfDoc_) {
-        pdfDoc = pdfDoc_;
-        document.getElementById('pageCount').textContent = pdfDoc.numPages;
-        
-        // Initial page render
-        renderPage(pageNum);
-    });
+    function setPageCount(count) {
+        pageCount = count;
+        document.getElementById('pageCount').textContent = count;
+    }
+
+    // Load the PDF, fetching only the byte ranges of the pages that are rendered
+    function loadPdf() {
+        pdfjsLib.getDocument({
+            url: document.body.dataset.pdfUrl,
+            disableAutoFetch: true,
+            disableStream: true
+        }).promise.then(function(pdfDoc_) {
+            pdfDoc = pdfDoc_;
+            setPageCount(pdfDoc.numPages);
+            
+            // Initial page render
+            renderPage(pageNum);
+        });
+    }
+
+    // Prefer pre-rendered page images; they need no client-side rasterizing
+    fetch('/page_images')
+        .then(response => response.json())
+        .then(manifest => {
+            if (!manifest.ready) {
+                loadPdf();
+                return;
+            }
+            pageImages = manifest;
+            setPageCount(manifest.pages);
+            renderPage(pageNum);
+        })
+        .catch(loadPdf);
+
+    function pageImageUrl(num) {
+        // The smallest rendering that fills the viewer at this screen's pixel density
+        const wanted = pdfViewer.clientWidth * (window.devicePixelRatio || 1);
+        const widths = [...pageImages.widths].sort((a, b) => a - b);
+        const width = widths.find(w => w >= wanted) || widths[widths.length - 1];
+        return pageImages.url.replace('{page}', num).replace('{width}', width);
+    }
+
+    function neighbours(num) {
+        return [num - 1, num + 1].map(n => n < 1 ? pageCount : (n > pageCount ? 1 : n));
+    }
+
+    // Warm the pages either side of num so the next flip is instant
+    function prefetchNeighbours(num) {
+        for (const n of neighbours(num)) {
+            if (pageImages) {
+                const url = pageImageUrl(n);
+                if (!prefetched.has(url)) {
+                    prefetched.add(url);
+                    new Image().src = url;
+                }
+            } else if (pdfDoc) {
+                pdfDoc.getPage(n);
+            }
+        }
+    }
 
     function renderPage(num) {
-        pageRendering = true;
-        
         // Update page counter
         document.getElementById('pageNum').textContent = num;
         
         // Update slide text
         updateSlideText(num);
+        fetchSlideText(num);
+
+        if (pageImages) {
+            pageImage.src = pageImageUrl(num);
+            pageImage.alt = `Slide ${num}`;
+            pageImage.hidden = false;
+            canvas.hidden = true;
+            prefetchNeighbours(num);
+            return;
+        }
+
+        pageRendering = true;
 
         // Render PDF page
         pdfDoc.getPage(num).then(function(page) {
@@ -137,6 +274,8 @@ document.addEventListener('DOMContentLoaded', function() {
             if (pageNumPending !== null) {
                 renderPage(pageNumPending);
                 pageNumPending = null;
+            } else {
+                prefetchNeighbours(num);
             }
         });
     }
@@ -150,9 +289,10 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function onPrevPage() {
+        if (!pageCount) return;
         if (pageNum <= 1) {
             // Wrap to last page
-            pageNum = pdfDoc.numPages;
+            pageNum = pageCount;
         } else {
             pageNum--;
         }
@@ -160,7 +300,8 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function onNextPage() {
-        if (pageNum >= pdfDoc.numPages) {
+        if (!pageCount) return;
+        if (pageNum >= pageCount) {
             // Wrap to first page
             pageNum = 1;
         } else {
@@ -207,6 +348,32 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Ask for a slide that has no summary yet; while the deck is processing, the server
+    // moves it to the front of the queue and holds the request until it is ready
+    function fetchSlideText(num) {
+        const slideData = slideTexts[num];
+        if ((slideData && (typeof slideData === 'string' || slideData.summary)) || slideRequests.has(num)) return;
+        slideRequests.add(num);
+        fetch(`/slide_texts/${num}`)
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                slideRequests.delete(num);
+                if (!data) return;
+                if (data.status === 'ready') {
+                    slideTexts[num] = {
+                        title: data.title,
+                        summary: data.summary
+                    };
+                    if (num === pageNum) {
+                        updateSlideText(num);
+                    }
+                } else if (data.status === 'pending' && num === pageNum) {
+                    fetchSlideText(num);
+                }
+            })
+            .catch(() => slideRequests.delete(num));
+    }
+
     // Button event listeners
     document.getElementById('prevPage').addEventListener('click', onPrevPage);
     document.getElementById('nextPage').addEventListener('click', onNextPage);
@@ -237,6 +404,63 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Process PDF button handler
     const uploadBtn = document.getElementById('uploadBtn');
+    const uploadBtnLabel = '<span class="button-icon">📤</span>Upload Slides to Summarize';
+
+    function resetUploadBtn() {
+        uploadBtn.disabled = false;
+        uploadBtn.innerHTML = uploadBtnLabel;
+    }
+
+    // Fill in summaries as the server finishes them instead of reloading blindly
+    function followProcessing(jobId) {
+        const events = new EventSource(`/process_pdf/${jobId}/events`);
+
+        let completed = 0;
+        events.addEventListener('started', () => {
+            uploadBtn.textContent = 'Processing...';
+        });
+
+        // The total grows as the chunk summary streams in and more slides get scheduled
+        events.addEventListener('scheduled', (e) => {
+            const data = JSON.parse(e.data);
+            uploadBtn.textContent = `Processing... ${completed}/${data.total}`;
+        });
+
+        events.addEventListener('slide', (e) => {
+            const data = JSON.parse(e.data);
+            slideTexts[data.slide_number] = {
+                title: data.title,
+                summary: data.summary
+            };
+            if (data.slide_number === pageNum) {
+                updateSlideText(pageNum);
+            }
+            completed = data.completed;
+            uploadBtn.textContent = `Processing... ${data.completed}/${data.total}`;
+        });
+
+        events.addEventListener('slide_failed', (e) => {
+            const data = JSON.parse(e.data);
+            console.error(`Slide ${data.slide_number} failed after ${data.attempts} attempt(s): ${data.error}`);
+            completed = data.completed;
+            uploadBtn.textContent = `Processing... ${data.completed}/${data.total}`;
+        });
+
+        events.addEventListener('completed', (e) => {
+            const data = JSON.parse(e.data);
+            console.log(`Processed ${data.successful}/${data.total} slides in ${data.duration.toFixed(1)}s`);
+        });
+
+        events.addEventListener('end', (e) => {
+            const data = JSON.parse(e.data);
+            events.close();
+            resetUploadBtn();
+            if (data.status === 'failed') {
+                alert('Error: ' + data.error);
+            }
+        });
+    }
+
     uploadBtn.addEventListener('click', async function() {
         try {
             uploadBtn.disabled = true;
@@ -247,74 +471,17 @@ document.addEventListener('DOMContentLoaded', function() {
             });
             
             const data = await response.json();
-            if (data.success) {
-                alert('PDF processing started! The summaries will be updated shortly. This could take 1-4 minutes depending on the PDF size. Check your terminal prints.');
-                // Reload slide texts after a short delay
-                setTimeout(() => {
-                    loadSlideTexts();
-                }, 2000);
-            } else {
+            if (!data.success) {
                 throw new Error(data.error || 'Failed to process PDF');
             }
+            followProcessing(data.job_id);
         } catch (error) {
             console.error('Error:', error);
             alert('Error: ' + error.message);
-        } finally {
-            uploadBtn.disabled = false;
-            uploadBtn.innerHTML = '<span class="button-icon">📤</span>Upload Slides to Summarize';
-        }
-    });
-
-    document.getElementById('uploadForm').addEventListener('submit', async function(e) {
-        e.preventDefault();
-        
-        // Clear existing slides and reset progress immediately
-        document.getElementById('slideContainer').innerHTML = '';
-        document.getElementById('progressBar').style.width = '0%';
-        document.getElementById('progressBar').style.display = 'block';
-        
-        const formData = new FormData(this);
-        
-        try {
-            const response = await fetch('/upload', {
-                method: 'POST',
-                body: formData
-            });
-            
-            if (!response.ok) {
-                throw new Error('Upload failed');
-            }
-            
-            // Start checking progress
-            checkProgress();
-            
-        } catch (error) {
-            console.error('Error:', error);
-            alert('Upload failed: ' + error.message);
+            resetUploadBtn();
         }
     });
 
-    async function checkProgress() {
-        try {
-            const response = await fetch('/progress');
-            const data = await response.json();
-            
-            // Update progress bar
-            const progressBar = document.getElementById('progressBar');
-            progressBar.style.width = data.progress + '%';
-            
-            if (data.progress < 100) {
-                // Check again in 1 second
-                setTimeout(checkProgress, 1000);
-            } else {
-                // Processing complete - refresh the page
-                window.location.reload();
-            }
-        } catch (error) {
-            console.error('Error checking progress:', error);
-        }
-    }
-
     function updateSlideContainer(slideTexts) {
         const container = document.getElementById('slideContainer');
         container.innerHTML = ''; // Clear existing content
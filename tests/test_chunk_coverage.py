@@ -0,0 +1,95 @@
+import pytest
+
+from chunk_coverage import apply_assignments, clip_chunk, coverage_gaps
+
+
+def chunk(topic, numbers):
+    return {'topic': topic, 'slides': [f"slide {sn}" for sn in numbers], 'slide_numbers': list(numbers)}
+
+
+def assignment(sn, idx=None, topic='', content=''):
+    return {'slide_number': sn, 'chunk': idx, 'topic': topic, 'content': content}
+
+
+@pytest.mark.parametrize("numbers_per_chunk, page_count, missing, duplicates", [
+    ([[1, 2], [3, 4]], 4, [], {}),
+    ([[1, 2], [2, 3]], 5, [4, 5], {2: [0, 1]}),
+    # Out-of-range numbers and repeats within one chunk aren't gaps
+    ([[1, 1, 2, 9]], 3, [3], {}),
+    ([], 2, [1, 2], {}),
+])
+def test_coverage_gaps(numbers_per_chunk, page_count, missing, duplicates):
+    chunks = [chunk('t', numbers) for numbers in numbers_per_chunk]
+    assert coverage_gaps(chunks, page_count) == (missing, duplicates)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (chunk('t', [0, 1, 2, 7]), chunk('t', [1, 2])),
+    # Texts that don't line up with the numbers are kept as they are
+    ({'topic': 't', 'slides': ['a'], 'slide_numbers': [1, 7]}, {'topic': 't', 'slides': ['a'], 'slide_numbers': [1]}),
+])
+def test_clip_chunk(value, expected):
+    assert clip_chunk(value, 5) == expected
+
+
+@pytest.mark.parametrize("numbers_per_chunk, page_count, assignments, expected, follow_up_topics", [
+    pytest.param(
+        [[1, 2], [4, 5]], 5, [assignment(3, 1)],
+        [('A', [1, 2]), ('B', [4, 5]), ('B', [3])], ['B'],
+        id="missing page joins its assigned chunk",
+    ),
+    pytest.param(
+        [[1, 2], [4, 5]], 5, [assignment(3, None, 'Aside')],
+        [('A', [1, 2]), ('B', [4, 5]), ('Aside', [3])], ['Aside'],
+        id="missing page with no chunk but a topic starts a new chunk",
+    ),
+    pytest.param(
+        [[1, 2], [4, 5]], 5, [assignment(3, 7)],
+        [('A', [1, 2]), ('B', [4, 5]), ('A', [3])], ['A'],
+        id="unusable assignment goes to the nearest earlier chunk",
+    ),
+    pytest.param(
+        [[2, 3], [4, 5]], 5, [],
+        [('A', [2, 3]), ('B', [4, 5]), ('A', [1])], ['A'],
+        id="without an earlier chunk the next one is used",
+    ),
+    pytest.param(
+        [[1, 2, 3], [3, 4]], 4, [assignment(3, 1)],
+        [('A', [1, 2]), ('B', [3, 4])], [],
+        id="duplicate stays in its assigned chunk",
+    ),
+    pytest.param(
+        [[1, 2, 3], [3, 4]], 4, [assignment(3, 'x')],
+        [('A', [1, 2, 3]), ('B', [4])], [],
+        id="duplicate with an unusable assignment stays in its first chunk",
+    ),
+    pytest.param(
+        [[1], [1]], 2, [assignment(1, 1), assignment(1, 0)],
+        [('B', [1]), ('B', [2])], ['B'],
+        id="first assignment for a page wins and emptied chunks are dropped",
+    ),
+    pytest.param(
+        [], 2, [assignment(2, None, 'Closing')],
+        [('Uncategorized slides', [1]), ('Closing', [2])], ['Uncategorized slides', 'Closing'],
+        id="pages with nowhere to go are uncategorized",
+    ),
+    pytest.param(
+        [[1, 2, 9]], 3, ['junk', {'slide_number': 'three'}, assignment(3, 0, content='three')],
+        [('A', [1, 2]), ('A', [3])], ['A'],
+        id="malformed assignments and out-of-range pages are ignored",
+    ),
+])
+def test_apply_assignments(numbers_per_chunk, page_count, assignments, expected, follow_up_topics):
+    chunks = [chunk(topic, numbers) for topic, numbers in zip('AB', numbers_per_chunk)]
+    result, follow_ups = apply_assignments(chunks, page_count, assignments)
+    assert [(c['topic'], c['slide_numbers']) for c in result] == expected
+    assert [c['topic'] for c in follow_ups] == follow_up_topics
+    assert result[len(result) - len(follow_ups):] == follow_ups
+    # Afterwards every page is in exactly one chunk
+    assert coverage_gaps(result, page_count) == ([], {})
+
+
+def test_apply_assignments_keeps_slide_texts_with_their_pages():
+    chunks = [chunk('A', [1, 2, 3]), chunk('B', [3, 4])]
+    result, _ = apply_assignments(chunks, 5, [assignment(3, 1), assignment(5, 1, content='new page')])
+    assert [c['slides'] for c in result] == [['slide 1', 'slide 2'], ['slide 3', 'slide 4'], ['new page']]
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from fake_gemini import respond
+from json_repair import ChunkStreamParser, extract_json, find_json_span, looks_like_json, validate_chunk_schema
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', {'a': 1}),
+    ('```json\n{"a": 1}\n```', {'a': 1}),
+    ('Here you go: {"a": 1} thanks', {'a': 1}),
+    ("{'a': 'b'}", {'a': 'b'}),
+    ("{'a': 'it\\'s'}", {'a': "it's"}),
+    ('{"a": "it\'s"}', {'a': "it's"}),
+    ('{a: True, b: None}', {'a': True, 'b': None}),
+    ('{"a": [1, 2,],}', {'a': [1, 2]}),
+    ('{"a": "line\nbreak"}', {'a': 'line\nbreak'}),
+    ('{"a": "b}"}', {'a': 'b}'}),
+    # Truncated: cut back to the last complete member, then closed
+    ('[1, 2, 3', [1, 2]),
+    ('{"topic": "y", "slide_nu', {'topic': 'y'}),
+    ('{"a": 1, "b"', {'a': 1}),
+    ('{"a": 1, "b":', {'a': 1}),
+    ('{"a": -1.5e3, "b": tr', {'a': -1500.0}),
+    ('{"a": {"b": [1, {"c": 2', {'a': {'b': [1, {}]}}),
+    ('[{"a": 1}, {"b": 2', [{'a': 1}, {}]),
+    # A string value cut short is kept, without a dangling escape
+    ('{"a": "partial text', {'a': 'partial text'}),
+    ('{"a": "x\\', {'a': 'x'}),
+])
+def test_extract_json_repairs(text, expected):
+    assert extract_json(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    '',
+    'no json here',
+    # Unescaped quotes inside a string can't be told apart from the string's end
+    '{"a": "He said "hi""}',
+])
+def test_extract_json_rejects(text):
+    with pytest.raises(ValueError):
+        extract_json(text)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', True),
+    ('```json\n[1]\n```', True),
+    ('  {"a"', True),
+    ('**Answer**: use {braces}', False),
+    ('', False),
+])
+def test_looks_like_json(text, expected):
+    assert looks_like_json(text) is expected
+
+
+def test_find_json_span_without_json():
+    assert find_json_span('plain text') is None
+
+
+def chunk_response(pages):
+    return respond('chunks', '', [f"Topic {i}\nbody of page {i}" for i in range(1, pages + 1)])
+
+
+def test_every_truncation_of_a_chunk_response_parses_locally():
+    full = chunk_response(30)
+    for end in range(len(full) // 3, len(full) + 1):
+        value = extract_json(full[:end])
+        assert isinstance(value, dict), end
+
+
+@pytest.mark.parametrize("piece_size", [1, 7, 64, 100000])
+def test_chunk_stream_parser_matches_the_complete_response(piece_size):
+    full = f"Sure, here it is:\n```json\n{chunk_response(12)}\n```"
+    parser = ChunkStreamParser()
+    streamed = []
+    for start in range(0, len(full), piece_size):
+        streamed.extend(parser.feed(full[start:start + piece_size]))
+    assert streamed == validate_chunk_schema(json.loads(chunk_response(12)))['chunks']
+
+
+@pytest.mark.parametrize("pieces, expected", [
+    # Each chunk comes out as soon as its object closes
+    (['{"chunks": [{"topic": "a", "slide_numbers": [1]}', ', {"topic": "b", ', '"slide_numbers": [2]}]}'],
+     [['a'], [], ['b']]),
+    # Brackets and quotes inside strings don't end a chunk
+    (['{"academic_context": "x {y} [", "chunks": [{"topic": "a \\"}\\"", "slides": ["{", "]"], ',
+      '"slide_numbers": [1, 2]}]}'],
+     [[], ['a "}"']]),
+    # Chunks without slide numbers are dropped; nested objects stay inside their chunk
+    (['{"chunks": [{"topic": "a"}, {"topic": "b", "meta": {"x": 1}, "slide_numbers": [3]}]}'],
+     [['b']]),
+])
+def test_chunk_stream_parser_emits_chunks_as_they_close(pieces, expected):
+    parser = ChunkStreamParser()
+    assert [[chunk['topic'] for chunk in parser.feed(piece)] for piece in pieces] == expected
@@ -0,0 +1,85 @@
+import pytest
+
+from shards import Shard, localize_chunks, merge_shard_chunks, shard_ranges, shared_pages
+
+
+@pytest.mark.parametrize("pages, size, overlap, expected", [
+    (7, 3, 0, [Shard(0, 1, 3, 1, 3), Shard(1, 4, 6, 4, 6), Shard(2, 7, 7, 7, 7)]),
+    (7, 3, 1, [Shard(0, 1, 3, 1, 4), Shard(1, 4, 6, 3, 7), Shard(2, 7, 7, 6, 7)]),
+    (5, 10, 3, [Shard(0, 1, 5, 1, 5)]),
+])
+def test_shard_ranges(pages, size, overlap, expected):
+    shards = shard_ranges(pages, size, overlap)
+    assert shards == expected
+    # Cores partition the deck
+    assert [sn for s in shards for sn in range(s.core_start, s.core_end + 1)] == list(range(1, pages + 1))
+
+
+def test_shared_pages():
+    assert shared_pages(shard_ranges(30, 10, 2)) == {9, 10, 11, 12, 19, 20, 21, 22}
+
+
+def merge(pages, size, overlap, chunks_per_shard):
+    """Merge chunks given in deck slide numbers, as each shard would have numbered them."""
+    results = []
+    for shard, chunks in zip(shard_ranges(pages, size, overlap), chunks_per_shard):
+        local = [{
+            'topic': topic,
+            'slide_numbers': [sn - shard.start + 1 for sn in numbers],
+            'slides': [f"slide {sn}" for sn in numbers],
+        } for topic, numbers in chunks]
+        results.append(localize_chunks(shard, local))
+    return merge_shard_chunks(results)
+
+
+def span(first, last):
+    return list(range(first, last + 1))
+
+
+# Shards of 10 pages with 2 pages of overlap: they see 1-12, 9-22 and 19-30
+@pytest.mark.parametrize("chunks_per_shard, expected", [
+    pytest.param(
+        [[("Intro", span(1, 5)), ("Storage", span(6, 12))],
+         [("Storage", span(9, 22))],
+         [("Storage", span(19, 25)), ("Wrap-up", span(26, 30))]],
+        [("Intro", span(1, 5)), ("Storage", span(6, 25)), ("Wrap-up", span(26, 30))],
+        id="topic spanning three shards is joined transitively",
+    ),
+    pytest.param(
+        [[("A", span(1, 10)), ("B", span(11, 12))],
+         [("B", span(11, 20)), ("C", span(21, 22))],
+         [("C", span(21, 30))]],
+        [("A", span(1, 10)), ("B", span(11, 20)), ("C", span(21, 30))],
+        id="topics breaking on shard boundaries stay apart",
+    ),
+    pytest.param(
+        [[("A", span(1, 8))],
+         [("B", span(11, 20))],
+         [("C", span(21, 30))]],
+        [("A", span(1, 8)), ("B", span(11, 20)), ("C", span(21, 30))],
+        id="pages no shard listed are left for coverage reconciliation",
+    ),
+    pytest.param(
+        [[("A", span(1, 12))],
+         [("B", span(13, 20))],
+         [("C", span(21, 30))]],
+        [("A", span(1, 12)), ("B", span(13, 20)), ("C", span(21, 30))],
+        id="overlap pages their own shard skipped go to the neighbour that listed them",
+    ),
+])
+def test_merge_shard_chunks(chunks_per_shard, expected):
+    chunks = merge(30, 10, 2, chunks_per_shard)
+    assert [(chunk['topic'], chunk['slide_numbers']) for chunk in chunks] == expected
+    # No slide is in two chunks, and slide texts follow their slides
+    numbers = [sn for chunk in chunks for sn in chunk['slide_numbers']]
+    assert len(numbers) == len(set(numbers))
+    for chunk in chunks:
+        assert chunk['slides'] == [f"slide {sn}" for sn in chunk['slide_numbers']]
+
+
+def test_localize_chunks_drops_numbers_outside_the_shard():
+    shard = shard_ranges(30, 10, 2)[1]
+    # Shard 1 sees pages 9-22 and owns 11-20; local page 15 would be page 23
+    [chunk] = localize_chunks(shard, [{'topic': 'x', 'slide_numbers': [1, 14, 15], 'slides': []}])
+    assert chunk.seen == {9, 22}
+    assert chunk.owned == []